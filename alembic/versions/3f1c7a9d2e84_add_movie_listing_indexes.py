@@ -0,0 +1,80 @@
+"""add_movie_listing_indexes
+
+Revision ID: 3f1c7a9d2e84
+Revises: b2c9999537da
+Create Date: 2026-10-17 09:12:40.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c7a9d2e84'
+down_revision: Union[str, Sequence[str], None] = 'b2c9999537da'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Numeric vote count derived from the scraped text ("1.2M", "345K", "87")
+    op.execute("""
+        ALTER TABLE movies
+            ADD COLUMN IF NOT EXISTS votes_count BIGINT GENERATED ALWAYS AS (
+                CASE
+                    WHEN votes ~ '^[0-9]+(\\.[0-9]+)?[KkMmBb]?$' THEN
+                        (regexp_replace(votes, '[KkMmBb]$', '')::NUMERIC *
+                         CASE upper(right(votes, 1))
+                             WHEN 'K' THEN 1000
+                             WHEN 'M' THEN 1000000
+                             WHEN 'B' THEN 1000000000
+                             ELSE 1
+                             END)::BIGINT
+                    END
+                ) STORED
+    """)
+
+    # Keyset pagination indexes, one per sort key. They lead with watched since
+    # the listing is almost always split into watched / upcoming.
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_movies_watched_title ON movies (watched, lower(title), id)
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_movies_watched_rating ON movies (watched, COALESCE(rating, 0), id)
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_movies_watched_votes ON movies (watched, COALESCE(votes_count, 0), id)
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_movies_watched_inserted_at ON movies (watched, inserted_at, id)
+    """)
+
+    # The same without watched, for the listings that don't filter on it: the full
+    # list, and the per-user and boobies ones, which filter on the way through the index.
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_movies_title ON movies (lower(title), id)
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_movies_rating ON movies (COALESCE(rating, 0), id)
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_movies_votes ON movies (COALESCE(votes_count, 0), id)
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_movies_inserted_at ON movies (inserted_at, id)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX IF EXISTS idx_movies_inserted_at")
+    op.execute("DROP INDEX IF EXISTS idx_movies_votes")
+    op.execute("DROP INDEX IF EXISTS idx_movies_rating")
+    op.execute("DROP INDEX IF EXISTS idx_movies_title")
+    op.execute("DROP INDEX IF EXISTS idx_movies_watched_inserted_at")
+    op.execute("DROP INDEX IF EXISTS idx_movies_watched_votes")
+    op.execute("DROP INDEX IF EXISTS idx_movies_watched_rating")
+    op.execute("DROP INDEX IF EXISTS idx_movies_watched_title")
+    op.execute("ALTER TABLE movies DROP COLUMN IF EXISTS votes_count")
@@ -0,0 +1,45 @@
+"""add_jobs_table
+
+Revision ID: 4c7d2a9e1b58
+Revises: 8e1f3a6c2b94
+Create Date: 2026-10-17 19:26:31.408117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c7d2a9e1b58'
+down_revision: Union[str, Sequence[str], None] = '8e1f3a6c2b94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Status of the background jobs (jobs.JobQueue), so any API worker can answer
+    # /jobs/{id} for a job another one runs
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS jobs
+        (
+            id          TEXT PRIMARY KEY,
+            kind        TEXT                     NOT NULL,
+            status      TEXT                     NOT NULL,
+            created_at  TIMESTAMP WITH TIME ZONE NOT NULL,
+            finished_at TIMESTAMP WITH TIME ZONE,
+            result      JSONB,
+            error       TEXT
+        )
+    """)
+
+    # Finished jobs are deleted once they are older than JOB_RETENTION_HOURS
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_jobs_finished_at ON jobs (finished_at)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE IF EXISTS jobs")
@@ -0,0 +1,50 @@
+"""add_movie_rating_refresh_columns
+
+Revision ID: 5d2b8e4f7a16
+Revises: c51d0e7f9a23
+Create Date: 2026-10-17 14:05:18.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2b8e4f7a16'
+down_revision: Union[str, Sequence[str], None] = 'c51d0e7f9a23'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # When rating/votes were last checked against IMDb, and the validators IMDb sent
+    # with that page so the next check can be a conditional request
+    op.execute("""
+        ALTER TABLE movies
+            ADD COLUMN IF NOT EXISTS rating_refreshed_at TIMESTAMP WITH TIME ZONE,
+            ADD COLUMN IF NOT EXISTS imdb_etag           TEXT,
+            ADD COLUMN IF NOT EXISTS imdb_last_modified  TEXT
+    """)
+
+    # IMDb ratings go up to 10.0, which NUMERIC(2,1) can't hold
+    op.execute("ALTER TABLE movies ALTER COLUMN rating TYPE NUMERIC(3,1)")
+
+    # Refresh order: unwatched first, then never refreshed, then least recently refreshed
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_movies_rating_refresh
+            ON movies (watched, COALESCE(rating_refreshed_at, '-infinity'::timestamptz), id)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX IF EXISTS idx_movies_rating_refresh")
+    op.execute("ALTER TABLE movies ALTER COLUMN rating TYPE NUMERIC(2,1) USING LEAST(rating, 9.9)")
+    op.execute("""
+        ALTER TABLE movies
+            DROP COLUMN IF EXISTS imdb_last_modified,
+            DROP COLUMN IF EXISTS imdb_etag,
+            DROP COLUMN IF EXISTS rating_refreshed_at
+    """)
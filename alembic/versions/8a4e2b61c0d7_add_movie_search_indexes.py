@@ -0,0 +1,52 @@
+"""add_movie_search_indexes
+
+Revision ID: 8a4e2b61c0d7
+Revises: 3f1c7a9d2e84
+Create Date: 2026-10-17 10:05:17.204388
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a4e2b61c0d7'
+down_revision: Union[str, Sequence[str], None] = '3f1c7a9d2e84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # Full-text document, titles weighted above the description
+    op.execute("""
+        ALTER TABLE movies
+            ADD COLUMN IF NOT EXISTS search_document TSVECTOR GENERATED ALWAYS AS (
+                setweight(to_tsvector('simple', COALESCE(title, '')), 'A') ||
+                setweight(to_tsvector('simple', COALESCE(original_title, '')), 'A') ||
+                setweight(to_tsvector('simple', COALESCE(description, '')), 'C')
+                ) STORED
+    """)
+
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_movies_search_document ON movies USING GIN (search_document)
+    """)
+
+    # Trigram indexes for typo tolerant title matching
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_movies_title_trgm ON movies USING GIN (title gin_trgm_ops)
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_movies_original_title_trgm ON movies USING GIN (original_title gin_trgm_ops)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX IF EXISTS idx_movies_original_title_trgm")
+    op.execute("DROP INDEX IF EXISTS idx_movies_title_trgm")
+    op.execute("DROP INDEX IF EXISTS idx_movies_search_document")
+    op.execute("ALTER TABLE movies DROP COLUMN IF EXISTS search_document")
@@ -0,0 +1,29 @@
+"""add_movie_data_version_sequence
+
+Revision ID: 8e1f3a6c2b94
+Revises: 5d2b8e4f7a16
+Create Date: 2026-10-17 18:42:07.913254
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e1f3a6c2b94'
+down_revision: Union[str, Sequence[str], None] = '5d2b8e4f7a16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Version of the movie data shared by every API worker, bumped on each change
+    # broadcast over Postgres (BROADCAST_BACKEND=postgres)
+    op.execute("CREATE SEQUENCE IF NOT EXISTS movie_data_version")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP SEQUENCE IF EXISTS movie_data_version")
@@ -0,0 +1,42 @@
+"""add_scrape_cache_table
+
+Revision ID: c51d0e7f9a23
+Revises: 8a4e2b61c0d7
+Create Date: 2026-10-17 11:40:52.731906
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c51d0e7f9a23'
+down_revision: Union[str, Sequence[str], None] = '8a4e2b61c0d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Scrape results keyed by 'imdb:<id>' / 'letterboxd:<slug>'. A NULL value is a
+    # negative entry (page not found or without usable data).
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS scrape_cache
+        (
+            key        TEXT PRIMARY KEY,
+            value      JSONB,
+            fetched_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+        )
+    """)
+
+    # Used both to skip expired entries and to pick eviction victims
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_scrape_cache_expires_at ON scrape_cache (expires_at)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE IF EXISTS scrape_cache")
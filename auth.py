@@ -0,0 +1,235 @@
+import asyncio
+import datetime
+import logging
+import os
+import time
+from collections import OrderedDict
+
+import httpx
+import jwt
+from dotenv import load_dotenv
+from fastapi import Cookie, Request, Response
+from jwt import ExpiredSignatureError, InvalidTokenError
+
+from database.db import get_user_by_mail
+from discord_oauth import get_discord_user, refresh_access_token
+
+load_dotenv()
+
+JWT_SECRET = os.getenv("JWT_SECRET")
+JWT_ALGORITHM = "HS256"
+JWT_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
+# The cookie outlives the JWT in it, so an expired session still reaches current_user,
+# which renews it with Discord instead of sending the user through the login again
+SESSION_COOKIE_MAX_AGE = 60 * 60 * 24 * 90  # 90 days
+
+# How long a renewed session is handed to other requests that carried the same expired
+# one; Discord rotates refresh tokens, so each may only be used once
+SESSION_RENEWAL_GRACE = 60
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "1024"))
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class AuthError(Exception):
+    """Raised by the auth dependencies; turned into a {"error": message} response."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+def create_session_jwt(*, discord_access_token: str, discord_refresh_token: str, email: str) -> str:
+    payload = {
+        "sub": "discord_session",
+        "email": email,
+        "discord_access_token": discord_access_token,
+        "discord_refresh_token": discord_refresh_token,
+        "exp": datetime.datetime.now(datetime.UTC) + datetime.timedelta(minutes=JWT_EXPIRE_MINUTES),
+    }
+
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+
+def decode_session_jwt(token: str):
+    return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+
+
+def set_session_cookie(response: Response, session_jwt: str) -> None:
+    response.set_cookie(
+        key="session_token",
+        value=session_jwt,
+        httponly=True,
+        max_age=SESSION_COOKIE_MAX_AGE,
+        samesite="lax",
+    )
+
+
+_renewals: dict[str, asyncio.Task] = {}
+
+
+async def _renew_session(refresh_token: str) -> str:
+    try:
+        access_token, new_refresh_token = await refresh_access_token(refresh_token)
+        discord_user_info = await get_discord_user(access_token)
+        email = discord_user_info['email']
+    except (httpx.HTTPError, KeyError, ValueError) as e:
+        # KeyError/ValueError: Discord answered, but not with the tokens or user we need
+        logger.info(f"Could not renew session: {e!r}")
+        raise AuthError(401, "Session expired")
+
+    return create_session_jwt(
+        discord_access_token=access_token,
+        discord_refresh_token=new_refresh_token,
+        email=email,
+    )
+
+
+async def renew_session(session_token: str) -> str:
+    """Issue a new session JWT for an expired one, using its Discord refresh token.
+
+    Requests that arrive together with the same expired session share one renewal, and
+    a successful one is handed out for SESSION_RENEWAL_GRACE after. A failed renewal is
+    forgotten right away, so the next request tries again. Raises AuthError when the
+    session can't be renewed and the user has to log in again.
+    """
+    try:
+        payload = jwt.decode(session_token, JWT_SECRET, algorithms=[JWT_ALGORITHM], options={"verify_exp": False})
+    except InvalidTokenError as e:
+        logger.error(f"Invalid session token: {e}")
+        raise AuthError(401, "Invalid session")
+
+    refresh_token = payload.get('discord_refresh_token')
+    if not refresh_token:
+        raise AuthError(401, "Session expired")
+
+    renewal = _renewals.get(refresh_token)
+    if renewal is None:
+        renewal = asyncio.create_task(_renew_session(refresh_token))
+        _renewals[refresh_token] = renewal
+        renewal.add_done_callback(lambda task: _forget_renewal(task, refresh_token))
+    return await asyncio.shield(renewal)
+
+
+def _forget_renewal(task: asyncio.Task, refresh_token: str) -> None:
+    if task.cancelled() or task.exception() is not None:
+        _renewals.pop(refresh_token, None)
+    else:
+        asyncio.get_running_loop().call_later(SESSION_RENEWAL_GRACE, _renewals.pop, refresh_token, None)
+
+
+class UserCache:
+    """Users by email in front of get_user_by_mail, so resolving the caller of a
+    request is usually a dict lookup instead of a query.
+
+    Entries live for ttl seconds and at most max_entries are kept. invalidate() drops a
+    user right away; changes made outside this process show up once the entry expires.
+    """
+
+    def __init__(self, ttl: float = USER_CACHE_TTL, max_entries: int = USER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        # Bumped on every invalidation, so a lookup that raced one doesn't store stale data
+        self._generation = 0
+
+    async def get(self, email: str) -> dict | None:
+        entry = self._entries.get(email)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(email)
+            return entry[1]
+
+        generation = self._generation
+        user = await get_user_by_mail(email)
+        if user is None:
+            self._entries.pop(email, None)
+            return None
+
+        if generation == self._generation:
+            self._entries[email] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(email)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, email: str) -> None:
+        self._generation += 1
+        self._entries.pop(email, None)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+async def current_user(request: Request, session_token: str | None = Cookie(None)) -> dict:
+    """Dependency resolving the session cookie to the logged in user.
+
+    An expired session is renewed with Discord, and SessionRenewalMiddleware sends the
+    new cookie. Raises AuthError (401 without a valid session, 404 for an unknown user).
+    """
+    if not session_token:
+        raise AuthError(401, "Not authenticated")
+
+    try:
+        try:
+            payload = decode_session_jwt(session_token)
+        except ExpiredSignatureError:
+            session_jwt = await renew_session(session_token)
+            request.state.renewed_session = session_jwt
+            payload = decode_session_jwt(session_jwt)
+        email = payload.get('email')
+        if not email:
+            raise ValueError("Email not found in token")
+    except (InvalidTokenError, ValueError) as e:
+        logger.error(f"Invalid session token: {e}")
+        raise AuthError(401, "Invalid session")
+
+    user = await user_cache.get(email)
+    if not user:
+        logger.error(f"User with email {email} not found")
+        raise AuthError(404, "User not found")
+
+    return user
+
+
+async def optional_user(request: Request, session_token: str | None = Cookie(None)) -> dict | None:
+    """Like current_user, but None instead of an error for anonymous callers."""
+    try:
+        return await current_user(request, session_token)
+    except AuthError:
+        return None
+
+
+class SessionRenewalMiddleware:
+    """Sets the cookie of a session renewed by current_user on the outgoing response.
+
+    Handlers often build their own JSONResponse, which would drop a cookie set on the
+    dependency's response, so the cookie header is added at the ASGI level instead.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message):
+            session_jwt = scope.get("state", {}).get("renewed_session")
+            if message["type"] == "http.response.start" and session_jwt:
+                cookie = Response()
+                set_session_cookie(cookie, session_jwt)
+                message["headers"] = [
+                    *message.get("headers", []),
+                    *(header for header in cookie.raw_headers if header[0] == b"set-cookie"),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
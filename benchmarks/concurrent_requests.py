@@ -0,0 +1,66 @@
+"""Measure how many concurrent requests a single API worker can serve.
+
+Start the API with one worker (``uv run uvicorn main:app --port 23245``) and run:
+
+    uv run python -m benchmarks.concurrent_requests --url http://127.0.0.1:23245/movies
+
+For every concurrency level the script keeps that many requests in flight for a
+fixed duration and reports throughput and latency percentiles.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def run_level(client: httpx.AsyncClient, url: str, concurrency: int, duration: float) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await client.get(url)
+                response.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000 if latencies else 0.0,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0.0,
+    }
+
+
+async def main(url: str, levels: list[int], duration: float):
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        print(f"{'conc':>6} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+        for level in levels:
+            r = await run_level(client, url, level, duration)
+            print(f"{r['concurrency']:>6} {r['requests']:>9} {r['errors']:>7} {r['rps']:>9.1f} "
+                  f"{r['p50_ms']:>9.1f} {r['p99_ms']:>9.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:23245/movies')
+    parser.add_argument('--levels', default='1,8,32,128', help='comma separated concurrency levels')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per level')
+    args = parser.parse_args()
+    asyncio.run(main(args.url, [int(x) for x in args.levels.split(',')], args.duration))
@@ -0,0 +1,93 @@
+"""Compare the two compat.csv_migrator import modes on a synthetic CSV.
+
+    uv run python -m benchmarks.csv_import --rows 50000
+
+This writes to the database configured in .env, so point it at a scratch database.
+The synthetic movies use ids no real title has (tt9000000000 and up) and are deleted
+again at the end.
+
+"insert" is migrate(), one upsert per row in batches of 500. "copy" is
+migrate_copy(), COPY into a staging table and a single merge. The copy mode is run a
+second time on the same file to show the cost of a re-import where nothing changed.
+"""
+import argparse
+import csv
+import logging
+import random
+import string
+import tempfile
+import time
+from pathlib import Path
+
+import psycopg
+
+from compat.csv_migrator import migrate, migrate_copy
+from database.db import DB_URL
+
+FIRST_ID = 9_000_000_000
+CSV_FIELDS = ['id', 'title', 'original_title', 'description', 'letterboxd_url', 'imdb_url', 'boobies', 'watched',
+              'image_link', 'rating', 'votes']
+
+
+def write_synthetic_csv(path: Path, count: int) -> None:
+    rng = random.Random(42)
+    words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(2000)]
+    with path.open('w', newline='', encoding='utf-8') as fh:
+        writer = csv.DictWriter(fh, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for i in range(count):
+            movie_id = f'tt{FIRST_ID + i}'
+            writer.writerow({
+                'id': movie_id,
+                'title': ' '.join(rng.choices(words, k=3)).title(),
+                'original_title': '',
+                'description': ' '.join(rng.choices(words, k=40)),
+                'letterboxd_url': f'https://letterboxd.com/film/movie-{i}/',
+                'imdb_url': f'https://www.imdb.com/title/{movie_id}/',
+                'boobies': rng.random() < 0.1,
+                'watched': rng.random() < 0.5,
+                'image_link': f'https://m.media-amazon.com/images/M/{"".join(rng.choices(string.ascii_letters, k=60))}',
+                'rating': f'{rng.uniform(1, 9.9):.1f}',
+                'votes': f'{rng.randint(1, 999)}K',
+            })
+
+
+def delete_synthetic_movies() -> None:
+    with psycopg.connect(DB_URL) as conn:
+        conn.execute("DELETE FROM movies WHERE id ~ '^tt9[0-9]{9}$'")
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main(count: int):
+    logging.getLogger('csv_migrator').setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'movies.csv'
+        write_synthetic_csv(path, count)
+        print(f'{count} rows, {path.stat().st_size / 1e6:.1f} MB')
+
+        try:
+            # (name, import function, start from an empty table)
+            runs = [
+                ('insert (fresh)', migrate, True),
+                ('copy (fresh)', migrate_copy, True),
+                ('copy (unchanged)', migrate_copy, False),
+            ]
+            for name, run, fresh in runs:
+                if fresh:
+                    delete_synthetic_movies()
+                seconds = timed(lambda: run(path))
+                print(f'  {name:<17} {seconds:8.2f} s  {count / seconds:>10,.0f} rows/s')
+        finally:
+            delete_synthetic_movies()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    args = parser.parse_args()
+    main(args.rows)
@@ -0,0 +1,159 @@
+"""Parse time and peak memory of each IMDb extraction path over saved title pages.
+
+Save a few pages as fixtures first, e.g.
+
+    curl -A 'Mozilla/5.0' -H 'Accept-Language: en-US' https://www.imdb.com/title/tt0111161/ \\
+        --create-dirs -o benchmarks/fixtures/tt0111161.html
+
+and run:
+
+    uv run python -m benchmarks.imdb_parse
+
+Without saved pages, --synthetic 5 generates that many IMDb-like pages instead: the
+same JSON-LD block, __NEXT_DATA__ state and rendered markup the parsers look for,
+padded to the size of a real title page. Real pages make for more telling numbers.
+
+"html.parser" is the pure-Python BeautifulSoup pass fetch_imdb used to run on
+every page; parse_imdb_page is what it runs now.
+"""
+import argparse
+import html
+import json
+import random
+import statistics
+import string
+import tempfile
+import time
+import tracemalloc
+from functools import partial
+from pathlib import Path
+
+from movienite import _parse_imdb_html, _parse_imdb_json_ld, _parse_imdb_next_data, parse_imdb_page
+
+FIXTURES_DIR = Path(__file__).parent / 'fixtures'
+# Roughly what IMDb sends for a title: half markup, half __NEXT_DATA__
+SYNTHETIC_MARKUP_BYTES = 700_000
+SYNTHETIC_STATE_BYTES = 700_000
+
+ENGINES = {
+    'parse_imdb_page': parse_imdb_page,
+    'json-ld': _parse_imdb_json_ld,
+    '__NEXT_DATA__': _parse_imdb_next_data,
+    'lxml': _parse_imdb_html,
+    'html.parser': partial(_parse_imdb_html, parser='html.parser'),
+}
+
+
+def synthetic_page(rng: random.Random, words: list[str], title_id: str) -> str:
+    def text(count: int) -> str:
+        return ' '.join(rng.choices(words, k=count))
+
+    title = text(3).title()
+    original_title = text(3).title()
+    plot = text(40)
+    image = f'https://m.media-amazon.com/images/M/{"".join(rng.choices(string.ascii_letters, k=60))}.jpg'
+    rating = round(rng.uniform(1, 9.9), 1)
+    votes = rng.randint(1, 3_000_000)
+
+    json_ld = {
+        '@context': 'https://schema.org', '@type': 'Movie', 'url': f'https://www.imdb.com/title/{title_id}/',
+        'name': title, 'alternateName': original_title, 'description': plot, 'image': image,
+        'aggregateRating': {'@type': 'AggregateRating', 'ratingValue': rating, 'ratingCount': votes},
+    }
+
+    # Unrelated page state, like the cast, reviews and recommendations IMDb ships
+    filler = []
+    size = 0
+    while size < SYNTHETIC_STATE_BYTES:
+        item = {'id': f'nm{rng.randrange(10_000_000):07d}', 'name': text(2).title(), 'text': text(30),
+                'image': {'url': image, 'width': 1000, 'height': 1500}}
+        filler.append(item)
+        size += len(json.dumps(item))
+    next_data = {'props': {'pageProps': {
+        'aboveTheFoldData': {
+            'id': title_id,
+            'titleText': {'text': title},
+            'originalTitleText': {'text': original_title},
+            'plot': {'plotText': {'plainText': plot}},
+            'primaryImage': {'url': image},
+            'ratingsSummary': {'aggregateRating': rating, 'voteCount': votes},
+        },
+        'mainColumnData': {'items': filler},
+    }}}
+
+    markup = []
+    size = 0
+    while size < SYNTHETIC_MARKUP_BYTES:
+        block = (f'<div class="ipc-metadata-list__item"><a class="ipc-link" href="/name/nm{rng.randrange(10**7):07d}/">'
+                 f'{html.escape(text(2).title())}</a><span class="ipc-inline-list__item">{html.escape(text(8))}</span>'
+                 '</div>')
+        markup.append(block)
+        size += len(block)
+    buttons = ''.join(f'<span class="ipc-btn__text">{html.escape(text(1))}</span>' for _ in range(8))
+
+    return f'''<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>{html.escape(title)} - IMDb</title>
+<script type="application/ld+json">{json.dumps(json_ld)}</script></head><body>
+<section><div><h1><span class="hero__primary-text">{html.escape(title)}</span></h1>
+<div>Original title: {html.escape(original_title)}</div></div>
+<p data-testid="plot"><span role="presentation">{html.escape(plot)}</span></p>
+<img class="ipc-image" src="{image}"/>{buttons}<span class="ipc-btn__text">{rating}/10{votes}</span></section>
+<section>{''.join(markup)}</section>
+<script id="__NEXT_DATA__" type="application/json">{json.dumps(next_data)}</script></body></html>'''
+
+
+def write_synthetic_pages(directory: Path, count: int) -> None:
+    rng = random.Random(42)
+    words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(2000)]
+    for i in range(count):
+        title_id = f'tt{9_000_000 + i}'
+        (directory / f'{title_id}.html').write_text(synthetic_page(rng, words, title_id), encoding='utf-8')
+
+
+def measure(extract, page: str, repeat: int) -> tuple[float, int, bool]:
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            result = extract(page)
+        except Exception:
+            result = None
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        extract(page)
+    except Exception:
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return statistics.median(timings) * 1000, peak, bool(result)
+
+
+def main(fixtures: Path, repeat: int):
+    pages = sorted(fixtures.glob('*.html'))
+    if not pages:
+        raise SystemExit(f'No *.html fixtures in {fixtures}, save some or pass --synthetic')
+
+    print(f"{'page':<20} {'engine':<16} {'ok':>3} {'median ms':>10} {'peak KiB':>10}")
+    for path in pages:
+        page = path.read_text(encoding='utf-8')
+        for name, extract in ENGINES.items():
+            ms, peak, ok = measure(extract, page, repeat)
+            print(f"{path.stem:<20} {name:<16} {'yes' if ok else 'no':>3} {ms:>10.2f} {peak / 1024:>10.0f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixtures', type=Path, default=FIXTURES_DIR)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--synthetic', type=int, metavar='N', help='generate N synthetic pages instead')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        with tempfile.TemporaryDirectory() as tmp:
+            write_synthetic_pages(Path(tmp), args.synthetic)
+            main(Path(tmp), args.repeat)
+    else:
+        main(args.fixtures, args.repeat)
@@ -0,0 +1,84 @@
+"""Compare the /movies serialization paths on a synthetic library.
+
+    uv run python -m benchmarks.serialization --movies 10000
+
+"before" is the dict FastAPI used to return, run through jsonable_encoder and the
+stdlib json module. "after" is fast_json.dumps on the same dicts. The byte counts
+show what goes over the wire uncompressed, gzip'd and brotli'd.
+"""
+import argparse
+import datetime
+import json
+import random
+import string
+import time
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+
+from database.db import row_to_movie_dict
+from fast_json import compress, dumps
+
+
+def synthetic_rows(count: int) -> list[dict]:
+    rng = random.Random(42)
+    words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(2000)]
+    now = datetime.datetime.now(datetime.UTC)
+    rows = []
+    for i in range(count):
+        rows.append({
+            'id': f'tt{i:07d}',
+            'title': ' '.join(rng.choices(words, k=3)).title(),
+            'original_title': '',
+            'description': ' '.join(rng.choices(words, k=40)),
+            'letterboxd_url': f'https://letterboxd.com/film/movie-{i}/',
+            'imdb_url': f'https://www.imdb.com/title/tt{i:07d}/',
+            'boobies': rng.random() < 0.1,
+            'watched': rng.random() < 0.5,
+            'image_link': f'https://m.media-amazon.com/images/M/{"".join(rng.choices(string.ascii_letters, k=60))}'
+                          f'._V1_QL75_UX380_CR0,0,380,562_.jpg',
+            'rating': Decimal(f'{rng.uniform(1, 10):.1f}'),
+            'votes': f'{rng.randint(1, 999)}K',
+            'inserted_at': now - datetime.timedelta(minutes=i),
+            'user_id': rng.randint(1, 20),
+            'user_username': f'user{rng.randint(1, 20)}',
+            'user_avatar_url': 'a1b2c3d4e5f6',
+            'user_discord_id': str(rng.randint(10 ** 17, 10 ** 18)),
+        })
+    return rows
+
+
+def timed(fn, repeat: int) -> tuple[float, object]:
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main(count: int, repeat: int):
+    rows = synthetic_rows(count)
+    payload = {'movies': [row_to_movie_dict(r) for r in rows], 'next_cursor': None}
+
+    before_ms, before = timed(lambda: json.dumps(jsonable_encoder(payload)).encode(), repeat)
+    after_ms, after = timed(lambda: dumps(payload), repeat)
+    assert json.loads(before) == json.loads(after)
+
+    print(f'{count} movies, best of {repeat}')
+    print(f'  jsonable_encoder + json: {before_ms:8.1f} ms')
+    print(f'  fast_json.dumps:         {after_ms:8.1f} ms')
+    print()
+    print(f'  identity: {len(after):>10} bytes')
+    for encoding, level in (('gzip', 5), ('gzip', 9), ('br', 5), ('br', 9)):
+        ms, body = timed(lambda: compress(after, encoding, level=level), 1)
+        print(f'  {encoding:<5} {level}: {len(body):>10} bytes  ({ms:.1f} ms)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movies', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    main(args.movies, args.repeat)
@@ -0,0 +1,154 @@
+"""Measure the cost of SSE fan-out to many connected clients.
+
+    uv run python -m benchmarks.sse_fanout --clients 5000
+
+Runs the EventBroker in process with simulated clients: every client iterates its own
+subscribe() stream the way a connection does, minus the socket, so the numbers are the
+broker's and the event loop's share of the work.
+
+The burst test publishes --events watched toggles spread over a few movies at --rate
+events per second, once per coalescing window, and reports the CPU time used until
+every client has everything, the frames and bytes each client received and the
+latency from publish to delivery (over a sample of the clients).
+
+The idle test compares heartbeats from the broker's shared ticker with the old
+per-client loop (a wait_for with a ping timeout in every connection) over --idle
+seconds, with a ping interval of --ping-interval.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from events import EventBroker
+
+LATENCY_SAMPLE_EVERY = 10
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def burst(clients: int, events: int, rate: float, window: float, movies: int) -> dict:
+    broker = EventBroker(coalesce_window=window)
+    broker.start()
+    index_of: dict[str, int] = {}
+    published: list[float] = []
+    # (index of the last event in the frame, arrival time, frame size) per client
+    received: list[list[tuple[int, float, int]]] = [[] for _ in range(clients)]
+
+    async def client(frames: list):
+        async for message in broker.subscribe(None):
+            if message["event"] == "movie_update":
+                frames.append((index_of[message["id"]], time.perf_counter(), len(message["data"])))
+
+    tasks = [asyncio.create_task(client(frames)) for frames in received]
+    await asyncio.sleep(0.5)
+
+    rng = random.Random(42)
+    watched = {}
+    cpu = time.process_time()
+    start = time.perf_counter()
+    for i in range(events):
+        delay = start + i / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        movie_id = f"tt{rng.randrange(movies):07d}"
+        watched[movie_id] = not watched.get(movie_id, False)
+        event_id = broker.publish({
+            "type": "movie_watched_toggled",
+            "movie_id": movie_id,
+            "changes": {"watched": watched[movie_id]},
+            "version": i + 1,
+        })
+        index_of[event_id] = i
+        published.append(time.perf_counter())
+
+    while any(not frames or frames[-1][0] < events - 1 for frames in received):
+        await asyncio.sleep(0.005)
+    cpu = time.process_time() - cpu
+
+    broker.close()
+    await asyncio.gather(*tasks)
+
+    latencies = []
+    for frames in received[::LATENCY_SAMPLE_EVERY]:
+        done = -1
+        for last, arrived, _size in frames:
+            latencies.extend(arrived - published[i] for i in range(done + 1, last + 1))
+            done = last
+    latencies.sort()
+
+    return {
+        "cpu": cpu,
+        "frames": len(received[0]),
+        "bytes": sum(size for _last, _arrived, size in received[0]),
+        "p50": percentile(latencies, 0.5),
+        "p99": percentile(latencies, 0.99),
+        "max": latencies[-1],
+    }
+
+
+async def idle_shared(clients: int, seconds: float, ping_interval: float) -> float:
+    broker = EventBroker(ping_interval=ping_interval)
+    broker.start()
+
+    async def client():
+        async for _message in broker.subscribe(None):
+            pass
+
+    tasks = [asyncio.create_task(client()) for _ in range(clients)]
+    await asyncio.sleep(0.5)
+    cpu = time.process_time()
+    await asyncio.sleep(seconds)
+    cpu = time.process_time() - cpu
+    broker.close()
+    await asyncio.gather(*tasks)
+    return cpu
+
+
+async def idle_per_client(clients: int, seconds: float, ping_interval: float) -> float:
+    async def client(wakeup: asyncio.Event):
+        pings = 0
+        while True:
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=ping_interval)
+            except asyncio.TimeoutError:
+                pings += 1
+
+    tasks = [asyncio.create_task(client(asyncio.Event())) for _ in range(clients)]
+    await asyncio.sleep(0.5)
+    cpu = time.process_time()
+    await asyncio.sleep(seconds)
+    cpu = time.process_time() - cpu
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return cpu
+
+
+async def main(args):
+    print(f"{args.clients} clients, {args.events} events at {args.rate:g}/s over {args.movies} movies")
+    print(f"  {'window':>8}  {'cpu':>7}  {'frames':>6}  {'KiB/client':>10}  {'p50':>8}  {'p99':>8}  {'max':>8}")
+    for window_ms in args.windows:
+        result = await burst(args.clients, args.events, args.rate, window_ms / 1000, args.movies)
+        print(f"  {window_ms:>6g}ms  {result['cpu']:>6.2f}s  {result['frames']:>6}  {result['bytes'] / 1024:>10.1f}"
+              f"  {result['p50'] * 1000:>6.1f}ms  {result['p99'] * 1000:>6.1f}ms  {result['max'] * 1000:>6.1f}ms")
+
+    print(f"idle for {args.idle:g}s, ping every {args.ping_interval:g}s")
+    shared = await idle_shared(args.clients, args.idle, args.ping_interval)
+    per_client = await idle_per_client(args.clients, args.idle, args.ping_interval)
+    print(f"  shared ticker      {shared:6.2f}s cpu")
+    print(f"  per-client timers  {per_client:6.2f}s cpu")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--events", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=200, help="events published per second")
+    parser.add_argument("--movies", type=int, default=20, help="movies the events are spread over")
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 100], help="coalescing windows in ms")
+    parser.add_argument("--idle", type=float, default=5)
+    parser.add_argument("--ping-interval", type=float, default=1)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import logging
+import os
+
+from database.db import get_movie_data_version, listen, notify
+from events import EventBroker
+from movie_cache import MoviesCache
+
+logger = logging.getLogger("uvicorn.error")
+
+# "local" reaches the clients of this process only; "postgres" every worker sharing the database
+BROADCAST_BACKEND = os.getenv("BROADCAST_BACKEND", "local")
+BROADCAST_CHANNEL = os.getenv("BROADCAST_CHANNEL", "movienite_events")
+
+# NOTIFY payloads must stay below 8000 bytes, bigger events are sent in chunks
+NOTIFY_CHUNK_SIZE = 7900
+LISTEN_START_TIMEOUT = 30
+LISTEN_RETRY_DELAY = 5
+
+
+class LocalBroadcast:
+    """Publishes events straight to the SSE clients of this process.
+
+    The default, and all a single worker needs. A movie change invalidates the /movies
+    cache and carries the new data version, which is counted by the cache.
+    """
+
+    def __init__(self, broker: EventBroker, cache: MoviesCache):
+        self.broker = broker
+        self.cache = cache
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def publish(self, event_type: str, data: dict | None = None, *, movie_change: bool = False) -> None:
+        event = {"type": event_type, **(data or {})}
+        if movie_change:
+            event["version"] = self.cache.invalidate()
+        self.broker.publish(event)
+
+
+class PostgresBroadcast(LocalBroadcast):
+    """Publishes events with Postgres NOTIFY, so every API worker, on any node, receives
+    them on its LISTEN connection and fans them out to its own clients.
+
+    Events are only handed to the local broker once Postgres delivers them back, which
+    it does in the same order everywhere, and they keep the id chosen by the publisher.
+    That lets a client reconnect to any worker and resume. Data versions come from the
+    movie_data_version sequence so all workers agree on them. When the LISTEN
+    connection drops, events may have been missed, so clients are told to resync.
+    """
+
+    def __init__(self, broker: EventBroker, cache: MoviesCache, channel: str = BROADCAST_CHANNEL):
+        super().__init__(broker, cache)
+        self.channel = channel
+        self._task: asyncio.Task | None = None
+        self._listening = asyncio.Event()
+        # Chunks of events still being received, by event id
+        self._partial: dict[str, list[str]] = {}
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+        await asyncio.wait_for(self._listening.wait(), timeout=LISTEN_START_TIMEOUT)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def publish(self, event_type: str, data: dict | None = None, *, movie_change: bool = False) -> None:
+        event_id = self.broker.next_event_id()
+
+        def messages(version: int | None) -> list[str]:
+            event = {"type": event_type, **(data or {})}
+            if version is not None:
+                event["version"] = version
+            # json.dumps escapes non-ASCII, so cutting by characters cuts by bytes too
+            payload = json.dumps(event)
+            chunks = [payload[i:i + NOTIFY_CHUNK_SIZE] for i in range(0, len(payload), NOTIFY_CHUNK_SIZE)]
+            # The index also keeps equal chunks apart; NOTIFY drops duplicates in a transaction
+            return [f"{event_id} {i} {len(chunks)} {chunk}" for i, chunk in enumerate(chunks)]
+
+        version = await notify(self.channel, messages, next_version=movie_change)
+        if version is not None:
+            # Don't keep serving the old data from here until the event comes back
+            self.cache.invalidate(version)
+
+    async def _on_listening(self) -> None:
+        self.cache.invalidate(await get_movie_data_version())
+        if self._listening.is_set():
+            logger.info("Broadcast connection restored, asking clients to resync")
+            self._partial.clear()
+            self.broker.resync()
+        self._listening.set()
+
+    def _receive(self, message: str) -> None:
+        event_id, _index, count, chunk = message.split(" ", 3)
+        if count == "1":
+            payload = chunk
+        else:
+            chunks = self._partial.setdefault(event_id, [])
+            chunks.append(chunk)
+            if len(chunks) < int(count):
+                return
+            payload = "".join(self._partial.pop(event_id))
+
+        event = json.loads(payload)
+        if "version" in event:
+            self.cache.invalidate(event["version"])
+        self.broker.publish(event, event_id)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async for message in listen(self.channel, self._on_listening):
+                    self._receive(message)
+            except Exception as e:
+                logger.error(f"Broadcast connection lost: {e}")
+            await asyncio.sleep(LISTEN_RETRY_DELAY)
+
+
+def create_broadcast(broker: EventBroker, cache: MoviesCache) -> LocalBroadcast:
+    """The broadcast backend chosen by BROADCAST_BACKEND."""
+    if BROADCAST_BACKEND == "postgres":
+        return PostgresBroadcast(broker, cache)
+    if BROADCAST_BACKEND != "local":
+        raise ValueError(f"Unknown BROADCAST_BACKEND {BROADCAST_BACKEND!r}")
+    return LocalBroadcast(broker, cache)
+
+
+async def announce_movie_change(event_type: str, data: dict) -> None:
+    """Publish a movie change made outside the API, e.g. by a script, so the workers drop
+    their cached /movies responses and pass the change on to their clients.
+
+    Needs the database pool to be open. Only the postgres backend reaches other
+    processes; with the local one this does nothing, and the workers only see the
+    change once their cached responses reach MOVIES_CACHE_MAX_AGE.
+    """
+    if BROADCAST_BACKEND == "postgres":
+        await PostgresBroadcast(EventBroker(), MoviesCache()).publish(event_type, data, movie_change=True)
@@ -1,5 +1,8 @@
+import argparse
+import asyncio
 import csv
 import logging
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Optional
 
@@ -7,7 +10,8 @@ import psycopg
 from dotenv import load_dotenv
 from psycopg.rows import dict_row
 
-from database.db import DB_URL
+from broadcast import announce_movie_change
+from database.db import DB_URL, close_pool, open_pool
 
 load_dotenv()
 
@@ -34,6 +38,65 @@ INSERT_SQL = """
                  votes = EXCLUDED.votes; \
              """
 
+MOVIE_FIELDS = ('id', 'title', 'original_title', 'description', 'letterboxd_url', 'imdb_url', 'boobies', 'watched',
+                'image_link', 'rating', 'votes')
+
+# Rows are COPY'd here first; ON COMMIT DROP cleans it up with the transaction
+CREATE_STAGING_SQL = """
+                     CREATE TEMP TABLE movies_staging
+                     (
+                         line           INTEGER NOT NULL,
+                         id             TEXT    NOT NULL,
+                         title          TEXT    NOT NULL,
+                         original_title TEXT,
+                         description    TEXT,
+                         letterboxd_url TEXT,
+                         imdb_url       TEXT,
+                         boobies        BOOLEAN NOT NULL,
+                         watched        BOOLEAN NOT NULL,
+                         image_link     TEXT,
+                         rating         NUMERIC(3, 1),
+                         votes          TEXT
+                     ) ON COMMIT DROP \
+                     """
+
+COPY_STAGING_SQL = f"COPY movies_staging (line, {', '.join(MOVIE_FIELDS)}) FROM STDIN"
+
+# When an id appears more than once the last line wins, as it did with one upsert per
+# row. Rows whose values are all unchanged are skipped instead of rewritten.
+MERGE_SQL = """
+            WITH merged AS (
+                INSERT INTO movies (id, title, original_title, description, letterboxd_url, imdb_url,
+                                    boobies, watched, image_link, rating, votes)
+                    SELECT DISTINCT ON (id) id, title, original_title, description, letterboxd_url, imdb_url,
+                                            boobies, watched, image_link, rating, votes
+                    FROM movies_staging
+                    ORDER BY id, line DESC
+                ON CONFLICT (id) DO UPDATE SET
+                    title = EXCLUDED.title,
+                    original_title = EXCLUDED.original_title,
+                    description = EXCLUDED.description,
+                    letterboxd_url = EXCLUDED.letterboxd_url,
+                    imdb_url = EXCLUDED.imdb_url,
+                    boobies = EXCLUDED.boobies,
+                    watched = EXCLUDED.watched,
+                    image_link = EXCLUDED.image_link,
+                    rating = EXCLUDED.rating,
+                    votes = EXCLUDED.votes
+                WHERE (movies.title, movies.original_title, movies.description, movies.letterboxd_url,
+                       movies.imdb_url, movies.boobies, movies.watched, movies.image_link, movies.rating,
+                       movies.votes)
+                    IS DISTINCT FROM
+                      (EXCLUDED.title, EXCLUDED.original_title, EXCLUDED.description, EXCLUDED.letterboxd_url,
+                       EXCLUDED.imdb_url, EXCLUDED.boobies, EXCLUDED.watched, EXCLUDED.image_link,
+                       EXCLUDED.rating, EXCLUDED.votes)
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT count(*) FILTER (WHERE inserted)     AS inserted,
+                   count(*) FILTER (WHERE NOT inserted) AS updated
+            FROM merged \
+            """
+
 
 def parse_bool(value: Optional[str]) -> bool:
     if value is None:
@@ -74,6 +137,71 @@ def normalize_row(row: dict) -> dict:
     }
 
 
+@dataclass
+class ImportResult:
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    # (line number, message) for every row that was rejected
+    errors: list[tuple[int, str]] = field(default_factory=list)
+
+
+def validate_row(row: dict) -> str | None:
+    """Return why a normalized row can't be imported, or None if it is fine."""
+    if not row['id']:
+        return 'missing id'
+    if not row['title']:
+        return 'missing title'
+    # IMDb ratings run from 1 to 10; the NUMERIC(3,1) column would take up to 99.9
+    if row['rating'] is not None and not 0 <= round(row['rating'], 1) <= 10:
+        return f"rating {row['rating']} out of range"
+    return None
+
+
+def migrate_copy(csv_path: Path = CSV_PATH) -> ImportResult:
+    """Import the CSV with COPY into a staging table and one set-based merge.
+
+    The file is streamed, so memory use does not grow with its size. Rows that fail
+    validation are skipped and reported with their line number; everything else is
+    imported in a single transaction.
+    """
+    if not csv_path.exists():
+        raise FileNotFoundError(f"CSV not found at {csv_path}")
+
+    result = ImportResult()
+    logger.info(f"Opening DB at {DB_URL}")
+    with psycopg.connect(DB_URL, autocommit=False) as conn:
+        with conn.cursor() as cur:
+            cur.execute(CREATE_STAGING_SQL)
+
+            logger.info(f"Reading CSV {csv_path}")
+            with csv_path.open(newline='', encoding='utf-8') as fh, cur.copy(COPY_STAGING_SQL) as copy:
+                reader = csv.DictReader(fh)
+                for row in reader:
+                    norm = normalize_row(row)
+                    error = validate_row(norm)
+                    if error:
+                        result.errors.append((reader.line_num, error))
+                        continue
+                    copy.write_row((reader.line_num, *(norm[name] for name in MOVIE_FIELDS)))
+                    result.rows += 1
+
+            # Duplicate ids collapse into one row in the merge
+            cur.execute("SELECT count(DISTINCT id) FROM movies_staging")
+            distinct_rows = cur.fetchone()[0]
+            cur.execute(MERGE_SQL)
+            result.inserted, result.updated = cur.fetchone()
+            result.unchanged = distinct_rows - result.inserted - result.updated
+            conn.commit()
+
+    for line, error in result.errors:
+        logger.warning(f"Line {line}: {error}")
+    logger.info(f"Migration complete: {result.inserted} inserted, {result.updated} updated, "
+                f"{result.unchanged} unchanged, {len(result.errors)} rejected")
+    return result
+
+
 def migrate(csv_path: Path = CSV_PATH, batch: int = 500):
     if not csv_path.exists():
         raise FileNotFoundError(f"CSV not found at {csv_path}")
@@ -108,5 +236,28 @@ def migrate(csv_path: Path = CSV_PATH, batch: int = 500):
     logger.info("Migration complete")
 
 
+async def announce_import() -> None:
+    """Tell the running API that movies were imported. The changes aren't itemized, so
+    clients refetch the list."""
+    await open_pool()
+    try:
+        await announce_movie_change('movies_reloaded', {})
+    finally:
+        await close_pool()
+
+
 if __name__ == '__main__':
-    migrate()
+    parser = argparse.ArgumentParser(description='Import movies.csv into the database.')
+    parser.add_argument('csv_path', nargs='?', type=Path, default=CSV_PATH)
+    parser.add_argument('--mode', choices=('copy', 'insert'), default='copy',
+                        help='copy: COPY + one merge (default); insert: batched upserts')
+    args = parser.parse_args()
+
+    if args.mode == 'copy':
+        result = migrate_copy(args.csv_path)
+        changed = result.inserted or result.updated
+    else:
+        migrate(args.csv_path)
+        changed = True
+    if changed:
+        asyncio.run(announce_import())
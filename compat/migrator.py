@@ -1,69 +1,165 @@
+"""Refresh the IMDb metadata of every movie in the database.
+
+    uv run python -m compat.migrator [--dry-run] [--concurrency 8] [--batch-size 200]
+
+Movies are read from the DB in id order, one batch at a time, scraped with bounded
+concurrency and written back per batch. Only the scraped fields are written, so
+watched, boobies and the owner set while the run goes on are kept, and every batch
+of changes is announced to the running API (see broadcast.announce_movie_change).
+After each batch the last processed id is saved to a checkpoint file, so an
+interrupted run picks up where it stopped. Pass --restart to ignore the checkpoint,
+or --dry-run to print what would change without writing anything.
+"""
+import argparse
+import asyncio
+import json
+import logging
+from decimal import Decimal, InvalidOperation
 from pathlib import Path
-import csv
-
-from movienite import fetch_imdb
-
-file = Path(__file__).parent.parent / 'movies.csv'
-FILE_NAME = str(file)
-fieldnames = ['id', 'title', 'original_title', 'description', 'letterboxd_url', 'imdb_url', 'boobies', 'watched', 'image_link', 'rating', 'votes']
-
-# Initial script that populates the CSV file with latest IMDb data
-def add_movie_csv(movie: dict):
-    existing_movies = get_movies_csv()['movies']
-    for existing_movie in existing_movies:
-        if existing_movie['id'] == movie['id']:
-            raise ValueError("Movie already exists")
-
-    with open(FILE_NAME, mode='a', encoding='utf-8', newline='') as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        if file.tell() == 0:
-            writer.writeheader()
-
-        writer.writerow(movie)
-
-
-def get_movies_csv():
-    movies_list = []
-    with open(FILE_NAME, mode='r', encoding='utf-8') as file:
-        csv_reader = csv.DictReader(file)
-        for row in csv_reader:
-            movies_list.append(row)
-
-    return {'movies': movies_list}
-
-
-def save_movies_csv(data: dict):
-    with open(FILE_NAME, mode='w', encoding='utf-8', newline='') as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        writer.writeheader()
-        for movie in data['movies']:
-            writer.writerow(movie)
-
-### Migration Script to Enrich Existing Movies with IMDB Data ###
-def migrate_existing_movies():
-    existing_movies = get_movies_csv()['movies']
-    print(f'Migrating {len(existing_movies)} existing movies')
-    for i, existing_movie in enumerate(existing_movies):
-        print(f'Processing movie {i + 1}/{len(existing_movies)}: {existing_movie.get("title", "Unknown Title")}')
-        imdb_url = existing_movie.get('imdb_url', '')
-        if not imdb_url:
-            print('no imdb url, skipping')
-            continue
 
-        movie_data = fetch_imdb(imdb_url)
-        if not movie_data:
-            print('failed to fetch imdb data, skipping')
-            continue
+from broadcast import announce_movie_change
+from database.db import close_pool, get_movies_after, open_pool, update_movie_metadata
+from movienite import close_client, fetch_imdb
+from rating_refresher import format_rating, storable_rating
+
+logger = logging.getLogger("migrator")
+logging.basicConfig(level=logging.INFO)
+
+CHECKPOINT_PATH = Path(__file__).parent / '.refresh_checkpoint.json'
+
+# Scraped fields that replace what is stored whenever IMDb returns a value
+REFRESHED_FIELDS = ('title', 'original_title', 'description', 'image_link', 'rating', 'votes')
+
+
+def new_checkpoint() -> dict:
+    return {'last_id': None, 'processed': 0, 'updated': 0, 'failed': 0}
 
-        for key, value in movie_data.items():
-            if value and (key not in existing_movie or not existing_movie[key]):
-                existing_movie[key] = value
 
-    print('Saving migrated movies...')
-    save_movies_csv({'movies': existing_movies})
+def load_checkpoint(path: Path) -> dict:
+    if not path.exists():
+        return new_checkpoint()
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def save_checkpoint(path: Path, checkpoint: dict) -> None:
+    # Write then rename, so a crash mid-write never leaves a truncated checkpoint
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(checkpoint), encoding='utf-8')
+    tmp.replace(path)
+
+
+def _comparable(field: str, value):
+    if field == 'rating':
+        try:
+            return Decimal(str(value)) if value not in (None, '') else None
+        except InvalidOperation:
+            return None
+    return value or ''
+
+
+def diff_movie(movie: dict, movie_data: dict) -> dict:
+    """Return {field: (old, new)} for the fields the scraped data would change."""
+    changes = {}
+    for field in REFRESHED_FIELDS:
+        new = movie_data.get(field)
+        if field == 'rating' and new and storable_rating(new) is None:
+            # Not a rating, keep the stored one
+            continue
+        if new and _comparable(field, new) != _comparable(field, movie.get(field)):
+            changes[field] = (movie.get(field), new)
+    # Keep a Letterboxd link someone set by hand
+    if movie_data.get('letterboxd_url') and not movie.get('letterboxd_url'):
+        changes['letterboxd_url'] = (movie.get('letterboxd_url'), movie_data['letterboxd_url'])
+    return changes
+
+
+async def refresh_movie(movie: dict, semaphore: asyncio.Semaphore) -> dict | None:
+    """Scrape one movie and return its changes, or None if it could not be fetched."""
+    if not movie.get('imdb_url'):
+        return None
+    async with semaphore:
+        movie_data = await fetch_imdb(movie['imdb_url'], letterboxd_url=movie.get('letterboxd_url') or None,
+                                      use_cache=False)
+    if not movie_data:
+        return None
+    return diff_movie(movie, movie_data)
+
+
+async def refresh_movies(
+        *,
+        concurrency: int = 8,
+        batch_size: int = 200,
+        dry_run: bool = False,
+        checkpoint_path: Path = CHECKPOINT_PATH,
+        restart: bool = False,
+) -> dict:
+    # Dry runs write nothing, so they neither resume from nor advance the checkpoint
+    checkpoint = new_checkpoint() if restart or dry_run else load_checkpoint(checkpoint_path)
+    if checkpoint['last_id']:
+        logger.info(f"Resuming after {checkpoint['last_id']} ({checkpoint['processed']} movies already processed)")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    await open_pool()
+    try:
+        while True:
+            movies = await get_movies_after(checkpoint['last_id'], batch_size)
+            if not movies:
+                break
+
+            results = await asyncio.gather(*(refresh_movie(movie, semaphore) for movie in movies))
+
+            updated = []
+            for movie, changes in zip(movies, results):
+                if changes is None:
+                    checkpoint['failed'] += 1
+                    logger.warning(f"Could not refresh {movie['id']} ({movie.get('title')})")
+                    continue
+                if not changes:
+                    continue
+                if dry_run:
+                    print(f"{movie['id']} {movie.get('title')}")
+                    for field, (old, new) in changes.items():
+                        print(f"    {field}: {old!r} -> {new!r}")
+                updated.append({'movie_id': movie['id'], 'changes': {
+                    field: format_rating(new) if field == 'rating' else new
+                    for field, (_old, new) in changes.items()
+                }})
+
+            if updated and not dry_run:
+                await update_movie_metadata([{'id': update['movie_id'], **update['changes']} for update in updated])
+                await announce_movie_change('movies_updated', {'updates': updated})
+
+            checkpoint['last_id'] = movies[-1]['id']
+            checkpoint['processed'] += len(movies)
+            checkpoint['updated'] += len(updated)
+            if not dry_run:
+                save_checkpoint(checkpoint_path, checkpoint)
+            logger.info(f"Processed {checkpoint['processed']} movies, {checkpoint['updated']} updated, "
+                        f"{checkpoint['failed']} failed")
+    finally:
+        await close_client()
+        await close_pool()
+
+    # A finished run starts from the beginning next time
+    if not dry_run:
+        checkpoint_path.unlink(missing_ok=True)
+    return checkpoint
 
 
 if __name__ == "__main__":
-    print('Starting migration of existing movies...')
-    migrate_existing_movies()
-    print('Migration complete.')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--checkpoint', type=Path, default=CHECKPOINT_PATH)
+    parser.add_argument('--restart', action='store_true')
+    args = parser.parse_args()
+
+    result = asyncio.run(refresh_movies(
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        dry_run=args.dry_run,
+        checkpoint_path=args.checkpoint,
+        restart=args.restart,
+    ))
+    print(f"Refresh complete: {result['processed']} processed, {result['updated']} updated, {result['failed']} failed")
@@ -1,5 +1,6 @@
 import datetime
 from dataclasses import dataclass
+from enum import Enum
 
 
 @dataclass
@@ -31,4 +32,14 @@ class NewUser:
             discord_id=self.discord_id,
             created_at=self.created_at,
             is_admin=self.is_admin
-        )
\ No newline at end of file
+        )
+
+
+class MutationOutcome(Enum):
+    """Result of a movie change made on behalf of a user."""
+    OK = 'ok'
+    NOT_FOUND = 'not_found'
+    # Not an admin, and not the movie's owner (or the action is admin-only)
+    FORBIDDEN = 'forbidden'
+    # Owners can't change movies once they have been watched
+    WATCHED = 'watched'
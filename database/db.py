@@ -1,11 +1,20 @@
+import base64
+import datetime
+import json
 import logging
 import os
+import re
+from collections.abc import AsyncIterator, Awaitable, Callable
 
 import psycopg
 from dotenv import load_dotenv
+from psycopg import sql
 from psycopg.rows import dict_row
+from psycopg.types.json import Jsonb
+from psycopg_pool import AsyncConnectionPool
 
-from data import NewUser, User
+from data import MutationOutcome, NewUser, User
+from metrics import Histogram, timed
 
 load_dotenv()
 
@@ -20,6 +29,39 @@ DB_HOST = os.getenv("POSTGRES_HOST")
 
 DB_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+DB_POOL_MIN_SIZE = int(os.getenv("POSTGRES_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("POSTGRES_POOL_TIMEOUT", "10"))
+
+# Process-wide pool shared by every helper below. It is opened and closed by the
+# application lifespan (or by scripts via open_pool/close_pool).
+pool = AsyncConnectionPool(
+    DB_URL,
+    min_size=DB_POOL_MIN_SIZE,
+    max_size=DB_POOL_MAX_SIZE,
+    timeout=DB_POOL_TIMEOUT,
+    check=AsyncConnectionPool.check_connection,
+    open=False,
+)
+
+DB_QUERY_SECONDS = Histogram(
+    "movienite_db_query_seconds",
+    "Time spent in database/db.py functions, connection checkout included",
+    ["function"],
+)
+
+
+async def open_pool() -> None:
+    """Open the shared connection pool and wait until min_size connections are ready."""
+    await pool.open(wait=True, timeout=DB_POOL_TIMEOUT)
+    logger.info(f"Database pool opened (min={DB_POOL_MIN_SIZE}, max={DB_POOL_MAX_SIZE})")
+
+
+async def close_pool() -> None:
+    """Close the shared connection pool."""
+    await pool.close()
+    logger.info("Database pool closed")
+
 
 def row_to_movie_dict(row: dict) -> dict:
     if row is None:
@@ -53,41 +95,171 @@ def row_to_movie_dict(row: dict) -> dict:
     return movie
 
 
-def get_movies() -> dict:
-    """Return all movies from the DB as {'movies': [...]} (CSV-like dicts)."""
+# Columns read by row_to_movie_dict, for queries over "movies m LEFT JOIN users u"
+MOVIE_COLUMNS = """
+    m.id, m.title, m.original_title, m.description, m.letterboxd_url, m.imdb_url, m.boobies, m.watched,
+    m.image_link, m.rating, m.votes, m.inserted_at, m.user_id,
+    u.username AS user_username, u.avatar_url AS user_avatar_url, u.discord_id AS user_discord_id
+"""
+
+# Sort key -> (SQL expression, type the cursor value is cast back to). The
+# expressions match the keyset indexes created in the 3f1c7a9d2e84 migration.
+MOVIE_SORT_KEYS = {
+    'title': ('lower(m.title)', 'text'),
+    'rating': ('COALESCE(m.rating, 0)', 'numeric'),
+    'votes': ('COALESCE(m.votes_count, 0)', 'bigint'),
+    'inserted_at': ('m.inserted_at', 'timestamptz'),
+}
+
+MOVIE_SORT_DIRECTIONS = ('asc', 'desc')
+
+
+def encode_movies_cursor(sort: str, direction: str, sort_value, movie_id: str) -> str:
+    """Build the opaque keyset cursor pointing just past the given row."""
+    raw = json.dumps([sort, direction, str(sort_value), movie_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_movies_cursor(cursor: str, sort: str, direction: str) -> tuple[str, str]:
+    """Return (sort_value, movie_id) from a cursor. Raises ValueError if it is malformed
+    or was issued for a different sort order."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, cursor_direction, sort_value, movie_id = json.loads(raw)
+    except Exception as e:
+        raise ValueError('Invalid cursor') from e
+
+    if (cursor_sort, cursor_direction) != (sort, direction):
+        raise ValueError('Cursor does not match the requested sort order')
+
+    return sort_value, movie_id
+
+
+@timed(DB_QUERY_SECONDS)
+async def get_movies(
+        *,
+        watched: bool | None = None,
+        user_id: int | None = None,
+        boobies: bool | None = None,
+        sort: str = 'title',
+        direction: str = 'asc',
+        limit: int | None = None,
+        cursor: str | None = None,
+) -> dict:
+    """Return movies from the DB as {'movies': [...], 'next_cursor': ...}.
+
+    Without a limit every matching movie is returned and next_cursor is None. With a
+    limit, at most that many movies are returned and next_cursor, when set, fetches the
+    following page. Raises ValueError for an unknown sort key/direction or a bad cursor.
+    """
+    if sort not in MOVIE_SORT_KEYS:
+        raise ValueError(f'Unknown sort key: {sort}')
+    if direction not in MOVIE_SORT_DIRECTIONS:
+        raise ValueError(f'Unknown sort direction: {direction}')
+
+    sort_expr, sort_type = MOVIE_SORT_KEYS[sort]
+    conditions = []
+    params = []
+
+    if watched is not None:
+        conditions.append('m.watched = %s')
+        params.append(watched)
+    if user_id is not None:
+        conditions.append('m.user_id = %s')
+        params.append(user_id)
+    if boobies is not None:
+        conditions.append('m.boobies = %s')
+        params.append(boobies)
+    if cursor:
+        sort_value, movie_id = decode_movies_cursor(cursor, sort, direction)
+        operator = '>' if direction == 'asc' else '<'
+        conditions.append(f'({sort_expr}, m.id) {operator} (%s::{sort_type}, %s)')
+        params.extend([sort_value, movie_id])
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    limit_clause = ''
+    if limit is not None:
+        # Fetch one extra row to know whether there is a next page
+        limit_clause = 'LIMIT %s'
+        params.append(limit + 1)
+
     movies = []
-    with psycopg.connect(DB_URL, row_factory=dict_row) as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT m.id,
-                       m.title,
-                       m.original_title,
-                       m.description,
-                       m.letterboxd_url,
-                       m.imdb_url,
-                       m.boobies,
-                       m.watched,
-                       m.image_link,
-                       m.rating,
-                       m.votes,
-                       m.inserted_at,
-                       m.user_id,
-                       u.username   AS user_username,
-                       u.avatar_url AS user_avatar_url,
-                       u.discord_id AS user_discord_id
+    next_cursor = None
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                f"""
+                SELECT {MOVIE_COLUMNS},
+                       {sort_expr} AS sort_value
                 FROM movies m
                          LEFT JOIN users u ON m.user_id = u.id
-                ORDER BY m.title NULLS LAST
-                """
+                {where}
+                ORDER BY {sort_expr} {direction}, m.id {direction}
+                {limit_clause}
+                """,
+                params
             )
-            rows = cur.fetchall()
+            rows = await cur.fetchall()
+
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_movies_cursor(sort, direction, last['sort_value'], last['id'])
+
+    for r in rows:
+        movies.append(row_to_movie_dict(r))
+    return {'movies': movies, 'next_cursor': next_cursor}
+
+
+def build_search_tsquery(query: str) -> str | None:
+    """Turn free text into a prefix-matching tsquery string ('star:* & war:*')."""
+    terms = re.findall(r'\w+', query.lower())
+    if not terms:
+        return None
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+@timed(DB_QUERY_SECONDS)
+async def search_movies(query: str, limit: int = 20) -> dict:
+    """Search titles, original titles and descriptions, best matches first.
+
+    Full-text prefix matches on the search_document column are combined with trigram
+    word similarity on the titles, so both 'star wa' and 'star wras' find the movie.
+    """
+    query = query.strip()
+    tsquery = build_search_tsquery(query)
+    if not tsquery:
+        return {'movies': []}
+
+    movies = []
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                f"""
+                WITH q AS (SELECT to_tsquery('simple', %(tsquery)s) AS tsq, %(query)s::TEXT AS text)
+                SELECT {MOVIE_COLUMNS},
+                       ts_rank_cd(m.search_document, q.tsq) +
+                       GREATEST(word_similarity(q.text, m.title),
+                                word_similarity(q.text, COALESCE(m.original_title, ''))) AS rank
+                FROM q
+                         CROSS JOIN movies m
+                         LEFT JOIN users u ON m.user_id = u.id
+                WHERE m.search_document @@ q.tsq
+                   OR q.text <%% m.title
+                   OR q.text <%% m.original_title
+                ORDER BY rank DESC, m.id
+                LIMIT %(limit)s
+                """,
+                {'tsquery': tsquery, 'query': query, 'limit': limit}
+            )
+            rows = await cur.fetchall()
             for r in rows:
                 movies.append(row_to_movie_dict(r))
     return {'movies': movies}
 
 
-def add_movie(movie: dict) -> None:
+@timed(DB_QUERY_SECONDS)
+async def add_movie(movie: dict) -> None:
     """Insert a single movie. Raises ValueError if the movie already exists (by id)."""
     movie_id = movie.get('id')
     if not movie_id:
@@ -103,13 +275,13 @@ def add_movie(movie: dict) -> None:
 
     user_id = movie.get('user_id')
 
-    with psycopg.connect(DB_URL) as conn:
-        with conn.cursor() as cur:
-            cur.execute('SELECT 1 FROM movies WHERE id = %s', (movie_id,))
-            if cur.fetchone():
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute('SELECT 1 FROM movies WHERE id = %s', (movie_id,))
+            if await cur.fetchone():
                 raise ValueError('Movie already exists')
 
-            cur.execute(
+            await cur.execute(
                 """
                 INSERT INTO movies (id, title, original_title, description, letterboxd_url, imdb_url, boobies, watched,
                                     image_link, rating, votes, user_id)
@@ -130,69 +302,148 @@ def add_movie(movie: dict) -> None:
                     user_id,
                 )
             )
-            conn.commit()
+            await conn.commit()
+
+
+# Upper bound on the rows bound into one statement by the bulk writers below
+SAVE_MOVIES_BATCH_SIZE = 1000
 
+# Source rows for bulk writes: one array parameter per column, see movie_columns()
+MOVIES_UNNEST = """
+    unnest(%s::text[], %s::text[], %s::text[], %s::text[], %s::text[], %s::text[], %s::boolean[],
+           %s::boolean[], %s::text[], %s::numeric[], %s::text[], %s::int[])
+        AS v(id, title, original_title, description, letterboxd_url, imdb_url, boobies, watched,
+             image_link, rating, votes, user_id)
+"""
 
-def save_movies(data: dict) -> None:
-    """Upsert a list of movies into the DB. Expects data == {'movies': [...]}"""
+
+def movie_columns(movies: list[dict]) -> tuple[list, ...] | None:
+    """Turn movies into one list per column, in the order MOVIES_UNNEST expects.
+
+    Movies without an id are dropped. Returns None when nothing is left.
+    """
+    rows = []
+    for movie in movies:
+        if not movie.get('id'):
+            continue
+        rating = movie.get('rating')
+        try:
+            rating_val = float(rating) if (rating is not None and str(rating).strip() != '') else None
+        except Exception:
+            rating_val = None
+
+        rows.append((
+            movie['id'],
+            movie.get('title'),
+            movie.get('original_title'),
+            movie.get('description'),
+            movie.get('letterboxd_url'),
+            movie.get('imdb_url'),
+            bool(movie.get('boobies', False)),
+            bool(movie.get('watched', False)),
+            movie.get('image_link'),
+            rating_val,
+            movie.get('votes'),
+            movie.get('user_id'),
+        ))
+
+    if not rows:
+        return None
+    return tuple(list(column) for column in zip(*rows))
+
+
+@timed(DB_QUERY_SECONDS)
+async def save_movies(data: dict) -> dict:
+    """Upsert a list of movies into the DB. Expects data == {'movies': [...]}
+
+    Movies are written in batches of SAVE_MOVIES_BATCH_SIZE, one statement per batch,
+    all in one transaction. Rows that would not change are left alone. Returns
+    {'inserted': n, 'updated': n, 'unchanged': n}.
+    """
     movies = data.get('movies', []) if data else []
     if not isinstance(movies, list):
         raise ValueError('save_movies expects a list of movies')
 
-    with psycopg.connect(DB_URL) as conn:
-        with conn.cursor() as cur:
-            for movie in movies:
-                movie_id = movie.get('id')
-                if not movie_id:
-                    continue
-                boobies = bool(movie.get('boobies', False))
-                watched = bool(movie.get('watched', False))
-                rating = movie.get('rating')
-                try:
-                    rating_val = float(rating) if (rating is not None and str(rating).strip() != '') else None
-                except Exception:
-                    rating_val = None
-
-                cur.execute(
-                    """
-                    INSERT INTO movies (id, title, original_title, description, letterboxd_url, imdb_url, boobies,
-                                        watched, image_link, rating, votes, user_id)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (id) DO UPDATE SET title          = EXCLUDED.title,
-                                                   original_title = EXCLUDED.original_title,
-                                                   description    = EXCLUDED.description,
-                                                   letterboxd_url = EXCLUDED.letterboxd_url,
-                                                   imdb_url       = EXCLUDED.imdb_url,
-                                                   boobies        = EXCLUDED.boobies,
-                                                   watched        = EXCLUDED.watched,
-                                                   image_link     = EXCLUDED.image_link,
-                                                   rating         = EXCLUDED.rating,
-                                                   votes          = EXCLUDED.votes,
-                                                   user_id        = EXCLUDED.user_id
-                    """,
-                    (
-                        movie_id,
-                        movie.get('title'),
-                        movie.get('original_title'),
-                        movie.get('description'),
-                        movie.get('letterboxd_url'),
-                        movie.get('imdb_url'),
-                        boobies,
-                        watched,
-                        movie.get('image_link'),
-                        rating_val,
-                        movie.get('votes'),
-                        movie.get('user_id'),
+    # A statement can't upsert the same id twice, the last copy wins as it used to
+    by_id = {movie['id']: movie for movie in movies if movie.get('id')}
+    movies = list(by_id.values())
+
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            for start in range(0, len(movies), SAVE_MOVIES_BATCH_SIZE):
+                batch = movies[start:start + SAVE_MOVIES_BATCH_SIZE]
+                await cur.execute(
+                    f"""
+                    WITH merged AS (
+                        INSERT INTO movies AS m (id, title, original_title, description, letterboxd_url, imdb_url,
+                                                 boobies, watched, image_link, rating, votes, user_id)
+                            SELECT * FROM {MOVIES_UNNEST}
+                        ON CONFLICT (id) DO UPDATE SET title          = EXCLUDED.title,
+                                                       original_title = EXCLUDED.original_title,
+                                                       description    = EXCLUDED.description,
+                                                       letterboxd_url = EXCLUDED.letterboxd_url,
+                                                       imdb_url       = EXCLUDED.imdb_url,
+                                                       boobies        = EXCLUDED.boobies,
+                                                       watched        = EXCLUDED.watched,
+                                                       image_link     = EXCLUDED.image_link,
+                                                       rating         = EXCLUDED.rating,
+                                                       votes          = EXCLUDED.votes,
+                                                       user_id        = EXCLUDED.user_id
+                        WHERE (m.title, m.original_title, m.description, m.letterboxd_url, m.imdb_url, m.boobies,
+                               m.watched, m.image_link, m.rating, m.votes, m.user_id)
+                            IS DISTINCT FROM
+                              (EXCLUDED.title, EXCLUDED.original_title, EXCLUDED.description,
+                               EXCLUDED.letterboxd_url, EXCLUDED.imdb_url, EXCLUDED.boobies, EXCLUDED.watched,
+                               EXCLUDED.image_link, EXCLUDED.rating, EXCLUDED.votes, EXCLUDED.user_id)
+                        RETURNING (xmax = 0) AS inserted
                     )
+                    SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted)
+                    FROM merged
+                    """,
+                    movie_columns(batch)
                 )
-            conn.commit()
+                inserted, updated = await cur.fetchone()
+                counts['inserted'] += inserted
+                counts['updated'] += updated
+                counts['unchanged'] += len(batch) - inserted - updated
+            await conn.commit()
+    return counts
 
 
-def add_user(user: NewUser) -> User:
+@timed(DB_QUERY_SECONDS)
+async def add_movies(movies: list[dict]) -> list[str]:
+    """Insert many movies in one statement, skipping ids that already exist.
+
+    Returns the ids that were actually inserted.
+    """
+    columns = movie_columns(movies)
+    if columns is None:
+        return []
+
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                f"""
+                INSERT INTO movies (id, title, original_title, description, letterboxd_url, imdb_url, boobies, watched,
+                                    image_link, rating, votes, user_id)
+                SELECT * FROM {MOVIES_UNNEST}
+                ON CONFLICT (id) DO NOTHING
+                RETURNING id
+                """,
+                columns
+            )
+            inserted = [row[0] for row in await cur.fetchall()]
+            await conn.commit()
+            return inserted
+
+
+@timed(DB_QUERY_SECONDS)
+async def add_user(user: NewUser) -> User:
     """Insert a new user into the DB."""
-    with psycopg.connect(DB_URL) as conn:
-        with conn.cursor() as cur:
-            cur.execute(
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
                 """
                 INSERT INTO users (username, avatar_url, email, discord_id, created_at, is_admin)
                 VALUES (%s, %s, %s, %s, %s, %s)
@@ -210,16 +461,17 @@ def add_user(user: NewUser) -> User:
                     user.is_admin
                 )
             )
-            new_user_id = cur.fetchone()[0]
-            conn.commit()
+            new_user_id = (await cur.fetchone())[0]
+            await conn.commit()
             return user.to_user(new_user_id)
 
 
-def get_user_by_mail(mail: str) -> dict | None:
+@timed(DB_QUERY_SECONDS)
+async def get_user_by_mail(mail: str) -> dict | None:
     """Retrieve a user by email."""
-    with psycopg.connect(DB_URL, row_factory=dict_row) as conn:
-        with conn.cursor() as cur:
-            cur.execute(
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
                 """
                 SELECT id, username, avatar_url, email, discord_id, created_at, is_admin
                 FROM users
@@ -227,7 +479,7 @@ def get_user_by_mail(mail: str) -> dict | None:
                 """,
                 (mail,)
             )
-            row = cur.fetchone()
+            row = await cur.fetchone()
             if row:
                 return {
                     'id': row.get('id'),
@@ -241,60 +493,444 @@ def get_user_by_mail(mail: str) -> dict | None:
     return None
 
 
-def get_movie_by_id(movie_id: str) -> dict | None:
-    """Return a single movie row (raw DB fields) or None if not found.
+@timed(DB_QUERY_SECONDS)
+async def get_movie(movie_id: str) -> dict | None:
+    """Return a single movie in the same shape as the entries of get_movies, or None."""
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                f"""
+                SELECT {MOVIE_COLUMNS}
+                FROM movies m
+                         LEFT JOIN users u ON m.user_id = u.id
+                WHERE m.id = %s
+                """,
+                (movie_id,)
+            )
+            row = await cur.fetchone()
+            return row_to_movie_dict(row) if row else None
+
+
+@timed(DB_QUERY_SECONDS)
+async def get_movies_after(after_id: str | None, limit: int) -> list[dict]:
+    """Raw movie rows ordered by id, starting after after_id.
 
-    Returns a dict with at least 'id', 'user_id', and 'watched' keys when present.
+    For walking the whole table in fixed-size batches without holding it in memory.
     """
-    with psycopg.connect(DB_URL, row_factory=dict_row) as conn:
-        with conn.cursor() as cur:
-            cur.execute(
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
                 """
-                SELECT id, user_id, watched
+                SELECT id, title, original_title, description, letterboxd_url, imdb_url, boobies, watched,
+                       image_link, rating, votes, user_id
                 FROM movies
-                WHERE id = %s
+                WHERE %(after_id)s::text IS NULL OR id > %(after_id)s
+                ORDER BY id
+                LIMIT %(limit)s
                 """,
-                (movie_id,)
+                {'after_id': after_id, 'limit': limit}
             )
-            row = cur.fetchone()
-            return row if row else None
+            return await cur.fetchall()
 
 
-def delete_movie(movie_id: str) -> bool:
-    """Delete a movie by id. Returns True if a row was deleted, False otherwise."""
-    with psycopg.connect(DB_URL) as conn:
-        with conn.cursor() as cur:
-            cur.execute('DELETE FROM movies WHERE id = %s RETURNING id', (movie_id,))
-            res = cur.fetchone()
-            conn.commit()
-            return bool(res)
+@timed(DB_QUERY_SECONDS)
+async def claim_stale_movie_ratings(max_age: datetime.timedelta, limit: int) -> list[dict]:
+    """Claim the movies whose rating/votes were last refreshed more than max_age ago
+    (or never), unwatched ones first, then least recently refreshed first.
+
+    Claimed movies are marked as refreshed straight away, and rows another refresher is
+    claiming at the same moment are skipped, so refreshers in several workers never
+    pick the same movies. update_movie_ratings() stores the results.
+    """
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                UPDATE movies m
+                SET rating_refreshed_at = now()
+                FROM (SELECT id
+                      FROM movies
+                      WHERE COALESCE(rating_refreshed_at, '-infinity'::timestamptz) < now() - %s
+                      ORDER BY watched, COALESCE(rating_refreshed_at, '-infinity'::timestamptz), id
+                      LIMIT %s FOR UPDATE SKIP LOCKED) stale
+                WHERE m.id = stale.id
+                RETURNING m.id, m.imdb_url, m.rating, m.votes, m.imdb_etag, m.imdb_last_modified
+                """,
+                (max_age, limit)
+            )
+            movies = await cur.fetchall()
+            await conn.commit()
+            return movies
 
 
-def toggle_movie_watched(movie_id: str) -> bool | None:
-    """Toggle the watched flag for a movie and return the new watched value (True/False).
+@timed(DB_QUERY_SECONDS)
+async def update_movie_ratings(updates: list[dict]) -> None:
+    """Store refreshed ratings in one statement and mark the movies as refreshed.
 
-    Returns None if the movie was not found.
+    Each update has id, rating, votes, imdb_etag and imdb_last_modified. A None rating
+    or votes keeps the stored value, which is what a 304 from IMDb means.
     """
-    with psycopg.connect(DB_URL, row_factory=dict_row) as conn:
-        with conn.cursor() as cur:
-            cur.execute('UPDATE movies SET watched = NOT watched WHERE id = %s RETURNING watched', (movie_id,))
-            row = cur.fetchone()
-            conn.commit()
+    if not updates:
+        return
+
+    columns = tuple(
+        [update.get(name) for update in updates]
+        for name in ('id', 'rating', 'votes', 'imdb_etag', 'imdb_last_modified')
+    )
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE movies m
+                SET rating              = COALESCE(v.rating, m.rating),
+                    votes               = COALESCE(v.votes, m.votes),
+                    imdb_etag           = v.imdb_etag,
+                    imdb_last_modified  = v.imdb_last_modified,
+                    rating_refreshed_at = now()
+                FROM unnest(%s::text[], %s::numeric[], %s::text[], %s::text[], %s::text[])
+                         AS v(id, rating, votes, imdb_etag, imdb_last_modified)
+                WHERE m.id = v.id
+                """,
+                columns
+            )
+            await conn.commit()
+
+
+# Columns update_movie_metadata() writes, everything else a movie has is left alone
+MOVIE_METADATA_FIELDS = ('title', 'original_title', 'description', 'image_link', 'rating', 'votes', 'letterboxd_url')
+
+
+@timed(DB_QUERY_SECONDS)
+async def update_movie_metadata(updates: list[dict]) -> None:
+    """Store re-scraped metadata in one statement.
+
+    Each update has an id and any of MOVIE_METADATA_FIELDS; a missing or None field
+    keeps the stored value. Columns users change, like watched, boobies and user_id,
+    are never touched, so edits made while a refresh runs survive it.
+    """
+    if not updates:
+        return
+
+    columns = tuple(
+        [update.get(name) for update in updates]
+        for name in ('id', *MOVIE_METADATA_FIELDS)
+    )
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE movies m
+                SET title          = COALESCE(v.title, m.title),
+                    original_title = COALESCE(v.original_title, m.original_title),
+                    description    = COALESCE(v.description, m.description),
+                    image_link     = COALESCE(v.image_link, m.image_link),
+                    rating         = COALESCE(v.rating, m.rating),
+                    votes          = COALESCE(v.votes, m.votes),
+                    letterboxd_url = COALESCE(v.letterboxd_url, m.letterboxd_url)
+                FROM unnest(%s::text[], %s::text[], %s::text[], %s::text[], %s::text[], %s::numeric[], %s::text[],
+                            %s::text[])
+                         AS v(id, title, original_title, description, image_link, rating, votes, letterboxd_url)
+                WHERE m.id = v.id
+                """,
+                columns
+            )
+            await conn.commit()
+
+
+@timed(DB_QUERY_SECONDS)
+async def get_movies_by_ids(movie_ids: list[str]) -> list[dict]:
+    """Return the given movies in the same shape as the entries of get_movies."""
+    if not movie_ids:
+        return []
+
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                f"""
+                SELECT {MOVIE_COLUMNS}
+                FROM movies m
+                         LEFT JOIN users u ON m.user_id = u.id
+                WHERE m.id = ANY(%s)
+                ORDER BY lower(m.title), m.id
+                """,
+                (movie_ids,)
+            )
+            return [row_to_movie_dict(row) for row in await cur.fetchall()]
+
+
+# Per-user movie actions: (statement, admin only). Each statement changes the row only
+# when {allowed} holds and returns the new value, or nothing when the row was left alone.
+MOVIE_ACTIONS = {
+    'toggle_watched': (
+        'UPDATE movies m SET watched = NOT m.watched WHERE m.id = %(movie_id)s AND {allowed} RETURNING m.watched',
+        True,
+    ),
+    'set_watched': (
+        'UPDATE movies m SET watched = %(value)s WHERE m.id = %(movie_id)s AND {allowed} RETURNING m.watched',
+        True,
+    ),
+    'toggle_boobies': (
+        'UPDATE movies m SET boobies = NOT m.boobies WHERE m.id = %(movie_id)s AND {allowed} RETURNING m.boobies',
+        False,
+    ),
+    'delete': (
+        'DELETE FROM movies m WHERE m.id = %(movie_id)s AND {allowed} RETURNING true',
+        False,
+    ),
+}
+
+
+async def apply_movie_action(
+        cur,
+        action: str,
+        movie_id: str,
+        user_id: int,
+        value: object = None,
+) -> tuple[MutationOutcome, object]:
+    """Run a MOVIE_ACTIONS entry for user_id on cur, without committing. value is the
+    argument of actions that take one (set_watched).
+
+    The admin, ownership and not-watched rules are checked by the statement itself, so
+    there is no window between checking and changing. The same statement reports why
+    nothing changed. Returns (outcome, new value); the value is None unless outcome is OK.
+    """
+    statement, admin_only = MOVIE_ACTIONS[action]
+    allowed = '(SELECT is_admin FROM caller)'
+    if not admin_only:
+        allowed = f'({allowed} OR (m.user_id = %(user_id)s AND NOT m.watched))'
+
+    await cur.execute(
+        f"""
+        WITH caller AS (SELECT COALESCE(bool_or(is_admin), false) AS is_admin FROM users WHERE id = %(user_id)s),
+             target AS (SELECT user_id, watched FROM movies WHERE id = %(movie_id)s),
+             changed AS ({statement.format(allowed=allowed)})
+        SELECT (SELECT * FROM changed)                                     AS value,
+               EXISTS (SELECT 1 FROM changed)                              AS changed,
+               EXISTS (SELECT 1 FROM target)                               AS found,
+               COALESCE((SELECT user_id = %(user_id)s FROM target), false) AS is_owner,
+               COALESCE((SELECT watched FROM target), false)               AS watched,
+               (SELECT is_admin FROM caller)                               AS is_admin
+        """,
+        {'movie_id': movie_id, 'user_id': user_id, 'value': value}
+    )
+    row = await cur.fetchone()
+
+    if row['changed']:
+        return MutationOutcome.OK, row['value']
+    if admin_only and not row['is_admin']:
+        return MutationOutcome.FORBIDDEN, None
+    if not row['found'] or row['is_admin']:
+        # An admin is only refused when the movie is gone
+        return MutationOutcome.NOT_FOUND, None
+    if not row['is_owner']:
+        return MutationOutcome.FORBIDDEN, None
+    if row['watched']:
+        return MutationOutcome.WATCHED, None
+    # Deleted by someone else after the statement's snapshot was taken
+    return MutationOutcome.NOT_FOUND, None
+
+
+async def run_movie_action(action: str, movie_id: str, user_id: int) -> tuple[MutationOutcome, object]:
+    """apply_movie_action in its own transaction."""
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            result = await apply_movie_action(cur, action, movie_id, user_id)
+            await conn.commit()
+            return result
+
+
+@timed(DB_QUERY_SECONDS)
+async def run_movie_actions(
+        actions: list[tuple[str, str, object]],
+        user_id: int,
+) -> list[tuple[MutationOutcome, object]]:
+    """Apply (action, movie_id, value) triples in order, all in one transaction.
+
+    A refused action doesn't affect the others; the outcome of each is returned in the
+    same order.
+    """
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            results = [
+                await apply_movie_action(cur, action, movie_id, user_id, value)
+                for action, movie_id, value in actions
+            ]
+            await conn.commit()
+            return results
+
+
+@timed(DB_QUERY_SECONDS)
+async def delete_movie(movie_id: str, user_id: int) -> MutationOutcome:
+    """Delete a movie as user_id. Admins may delete any movie, owners their unwatched ones."""
+    outcome, _ = await run_movie_action('delete', movie_id, user_id)
+    return outcome
+
+
+@timed(DB_QUERY_SECONDS)
+async def toggle_movie_watched(movie_id: str, user_id: int) -> tuple[MutationOutcome, bool | None]:
+    """Toggle the watched flag as user_id (admins only). Returns the outcome and new value."""
+    return await run_movie_action('toggle_watched', movie_id, user_id)
+
+
+@timed(DB_QUERY_SECONDS)
+async def toggle_movie_boobies(movie_id: str, user_id: int) -> tuple[MutationOutcome, bool | None]:
+    """Toggle the boobies (nsfw) flag as user_id. Admins may change any movie, owners
+    their unwatched ones. Returns the outcome and new value."""
+    return await run_movie_action('toggle_boobies', movie_id, user_id)
+
+
+@timed(DB_QUERY_SECONDS)
+async def get_scrape_cache_entry(key: str) -> tuple[bool, dict | None]:
+    """Look up a fresh scrape cache entry.
+
+    Returns (found, value); value is None for a negative entry.
+    """
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                'SELECT value FROM scrape_cache WHERE key = %s AND expires_at > now()',
+                (key,)
+            )
+            row = await cur.fetchone()
             if not row:
-                return None
-            return bool(row.get('watched'))
+                return False, None
+            return True, row.get('value')
+
+
+@timed(DB_QUERY_SECONDS)
+async def put_scrape_cache_entry(key: str, value: dict | None, ttl: datetime.timedelta) -> None:
+    """Store a scrape result, None for a negative entry."""
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                INSERT INTO scrape_cache (key, value, fetched_at, expires_at)
+                VALUES (%s, %s, now(), now() + %s)
+                ON CONFLICT (key) DO UPDATE SET value      = EXCLUDED.value,
+                                                fetched_at = EXCLUDED.fetched_at,
+                                                expires_at = EXCLUDED.expires_at
+                """,
+                (key, Jsonb(value) if value is not None else None, ttl)
+            )
+            await conn.commit()
 
 
-def toggle_movie_boobies(movie_id: str) -> bool | None:
-    """Toggle the boobies (nsfw) flag for a movie and return the new value (True/False).
+@timed(DB_QUERY_SECONDS)
+async def evict_scrape_cache_entries(max_entries: int) -> int:
+    """Keep the scrape cache within max_entries and return how many entries were dropped.
 
-    Returns None if the movie was not found.
+    Expired entries are dropped first, then the ones closest to expiring.
     """
-    with psycopg.connect(DB_URL, row_factory=dict_row) as conn:
-        with conn.cursor() as cur:
-            cur.execute('UPDATE movies SET boobies = NOT boobies WHERE id = %s RETURNING boobies', (movie_id,))
-            row = cur.fetchone()
-            conn.commit()
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute('DELETE FROM scrape_cache WHERE expires_at <= now()')
+            evicted = cur.rowcount
+            await cur.execute(
+                """
+                DELETE FROM scrape_cache
+                WHERE key IN (SELECT key FROM scrape_cache ORDER BY expires_at DESC OFFSET %s)
+                """,
+                (max_entries,)
+            )
+            evicted += cur.rowcount
+            await conn.commit()
+    return evicted
+
+
+@timed(DB_QUERY_SECONDS)
+async def save_job(job: dict) -> None:
+    """Store the current state of a background job (see jobs.Job) for the other workers."""
+    async with pool.connection() as conn:
+        await conn.execute(
+            """
+            INSERT INTO jobs (id, kind, status, created_at, finished_at, result, error)
+            VALUES (%(id)s, %(kind)s, %(status)s, %(created_at)s, %(finished_at)s, %(result)s, %(error)s)
+            ON CONFLICT (id) DO UPDATE SET status      = EXCLUDED.status,
+                                           finished_at = EXCLUDED.finished_at,
+                                           result      = EXCLUDED.result,
+                                           error       = EXCLUDED.error
+            """,
+            {**job, 'result': Jsonb(job['result']) if job['result'] is not None else None}
+        )
+        await conn.commit()
+
+
+@timed(DB_QUERY_SECONDS)
+async def get_saved_job(job_id: str) -> dict | None:
+    """Return a job stored by save_job, shaped like jobs.Job.to_dict(), or None."""
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                'SELECT id, kind, status, created_at, finished_at, result, error FROM jobs WHERE id = %s',
+                (job_id,)
+            )
+            row = await cur.fetchone()
             if not row:
                 return None
-            return bool(row.get('boobies'))
+            return {
+                **row,
+                'created_at': row['created_at'].isoformat(),
+                'finished_at': row['finished_at'].isoformat() if row['finished_at'] else None,
+            }
+
+
+@timed(DB_QUERY_SECONDS)
+async def delete_finished_jobs(max_age: datetime.timedelta) -> int:
+    """Delete the jobs that finished more than max_age ago and return how many there were."""
+    async with pool.connection() as conn:
+        cur = await conn.execute('DELETE FROM jobs WHERE finished_at < now() - %s', (max_age,))
+        await conn.commit()
+        return cur.rowcount
+
+
+# Arbitrary key of the advisory lock that orders movie data versions
+MOVIE_DATA_VERSION_LOCK = 0x6d6f7669
+
+
+@timed(DB_QUERY_SECONDS)
+async def get_movie_data_version() -> int:
+    """Latest version handed out by notify(next_version=True), 0 if none was yet."""
+    async with pool.connection() as conn:
+        cur = await conn.execute('SELECT last_value, is_called FROM movie_data_version')
+        last_value, is_called = await cur.fetchone()
+        return last_value if is_called else 0
+
+
+@timed(DB_QUERY_SECONDS)
+async def notify(
+        channel: str,
+        messages: Callable[[int | None], list[str]],
+        *,
+        next_version: bool = False,
+) -> int | None:
+    """NOTIFY every message from messages(version) on channel in one transaction, so
+    listeners receive them back to back.
+
+    With next_version the next movie data version is taken first and passed to
+    messages; versions are handed out under a lock held until commit, so listeners see
+    them in increasing order. Returns the version, or None without next_version.
+    """
+    async with pool.connection() as conn:
+        async with conn.transaction():
+            version = None
+            if next_version:
+                await conn.execute('SELECT pg_advisory_xact_lock(%s)', (MOVIE_DATA_VERSION_LOCK,))
+                cur = await conn.execute("SELECT nextval('movie_data_version')")
+                version = (await cur.fetchone())[0]
+            for message in messages(version):
+                await conn.execute('SELECT pg_notify(%s, %s)', (channel, message))
+    return version
+
+
+async def listen(channel: str, on_listening: Callable[[], Awaitable[None]] | None = None) -> AsyncIterator[str]:
+    """Yield the payloads NOTIFYed on channel until the connection fails.
+
+    Uses a connection of its own, since LISTEN doesn't survive going back to the pool.
+    on_listening runs once the LISTEN is in place, before any payload is read.
+    """
+    async with await psycopg.AsyncConnection.connect(DB_URL, autocommit=True) as conn:
+        await conn.execute(sql.SQL('LISTEN {}').format(sql.Identifier(channel)))
+        if on_listening is not None:
+            await on_listening()
+        async for notification in conn.notifies():
+            yield notification.payload
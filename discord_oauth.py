@@ -11,9 +11,31 @@ discord_client_secret = os.getenv("DISCORD_CLIENT_SECRET")
 redirect_uri = os.getenv("DISCORD_REDIRECT_URI")
 scopes = ["identify", "email"]
 
+# Overridable so the OAuth flow can be pointed at a local fake server
+DISCORD_API_BASE_URL = os.getenv("DISCORD_API_BASE_URL", "https://discord.com/api")
+
+DISCORD_TIMEOUT = httpx.Timeout(connect=5.0, read=10.0, write=5.0, pool=5.0)
+
+_client: httpx.AsyncClient | None = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared Discord API client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(base_url=DISCORD_API_BASE_URL, timeout=DISCORD_TIMEOUT)
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
 
 def get_oauth_url():
-    base_url = "https://discord.com/api/oauth2/authorize"
+    base_url = f"{DISCORD_API_BASE_URL}/oauth2/authorize"
     query_string = urlencode({
         'client_id': discord_client_id,
         'redirect_uri': redirect_uri,
@@ -24,32 +46,45 @@ def get_oauth_url():
     return f"{base_url}?{query_string}"
 
 
-def get_access_token(code: str):
-    token_url = "https://discord.com/api/oauth2/token"
-    data = {
-        'client_id': discord_client_id,
-        'client_secret': discord_client_secret,
-        'grant_type': 'authorization_code',
-        'code': code,
-        'redirect_uri': redirect_uri,
-    }
+async def _request_token(data: dict) -> tuple[str, str]:
     headers = {
         'Content-Type': 'application/x-www-form-urlencoded'
     }
-
-    response = httpx.post(token_url, data=data, headers=headers)
+    response = await get_client().post("/oauth2/token", data={
+        'client_id': discord_client_id,
+        'client_secret': discord_client_secret,
+        **data,
+    }, headers=headers)
     response.raise_for_status()
     token_data = response.json()
 
     return token_data['access_token'], token_data['refresh_token']
 
 
-def get_discord_user(discord_access_token: str):
-    user_url = "https://discord.com/api/users/@me"
+async def get_access_token(code: str) -> tuple[str, str]:
+    return await _request_token({
+        'grant_type': 'authorization_code',
+        'code': code,
+        'redirect_uri': redirect_uri,
+    })
+
+
+async def refresh_access_token(refresh_token: str) -> tuple[str, str]:
+    """Trade a refresh token for a new (access_token, refresh_token) pair.
+
+    Discord rotates refresh tokens, so the one passed in is no longer valid afterwards.
+    """
+    return await _request_token({
+        'grant_type': 'refresh_token',
+        'refresh_token': refresh_token,
+    })
+
+
+async def get_discord_user(discord_access_token: str):
     headers = {
         'Authorization': f'Bearer {discord_access_token}'
     }
-    response = httpx.get(user_url, headers=headers)
+    response = await get_client().get("/users/@me", headers=headers)
     response.raise_for_status()
 
     return response.json()
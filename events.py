@@ -0,0 +1,305 @@
+import asyncio
+import itertools
+import os
+import secrets
+from collections import deque
+from collections.abc import AsyncIterator
+
+from fast_json import dumps
+from metrics import Counter, Gauge
+
+# Frames kept for clients that reconnect; one further behind gets a resync instead
+EVENT_HISTORY_SIZE = int(os.getenv("SSE_EVENT_HISTORY_SIZE", "1024"))
+SSE_PING_INTERVAL = float(os.getenv("SSE_PING_INTERVAL_SECONDS", "30"))
+# Events published within this window go out together as one frame; 0 sends each at once
+SSE_COALESCE_WINDOW = float(os.getenv("SSE_COALESCE_WINDOW_MS", "100")) / 1000
+
+SSE_EVENTS = Counter("movienite_sse_events_total", "Events published to SSE clients")
+SSE_FRAMES = Counter("movienite_sse_frames_total", "Frames sent out, each holding the events of one window")
+SSE_RESYNCS = Counter(
+    "movienite_sse_resyncs_total",
+    "Clients told to refetch: their Last-Event-ID was unknown, or the buffer lost what they missed",
+    ["reason"],
+)
+
+# Movie events coalesce() knows how to merge
+MERGEABLE_EVENTS = {
+    "movie_added", "movies_added", "movie_watched_toggled", "movie_boobies_toggled", "movies_updated",
+    "movie_deleted", "user_updated",
+}
+
+
+def coalesce(events: list[dict]) -> list[dict]:
+    """Merge the movie changes among events into a single movies_changed event.
+
+    The merged event holds the end result for every movie touched: added movies with
+    later changes applied, per-movie changes, deleted ids and updated users. It has the
+    version after the last change and, as since, the version before the first one.
+    Other events keep their order, the merged one takes the place of the last movie
+    change. events is returned as is with fewer than two movie changes, or one that
+    can't be merged.
+    """
+    changes = [event for event in events if "version" in event]
+    if len(changes) < 2 or any(event["type"] not in MERGEABLE_EVENTS for event in changes):
+        return events
+
+    added: dict[str, dict] = {}
+    updated: dict[str, dict] = {}
+    deleted: dict[str, None] = {}
+    users: dict[int, dict] = {}
+
+    def add(movie: dict):
+        deleted.pop(movie["id"], None)
+        updated.pop(movie["id"], None)
+        added[movie["id"]] = dict(movie)
+
+    def change(movie_id: str, movie_changes: dict):
+        if movie_id in added:
+            added[movie_id].update(movie_changes)
+        elif movie_id not in deleted:
+            updated.setdefault(movie_id, {}).update(movie_changes)
+
+    def delete(movie_id: str):
+        added.pop(movie_id, None)
+        updated.pop(movie_id, None)
+        deleted[movie_id] = None
+
+    for event in changes:
+        event_type = event["type"]
+        if event_type == "movie_added":
+            add(event["movie"])
+        elif event_type == "movies_added":
+            for movie in event["movies"]:
+                add(movie)
+        elif event_type == "movies_updated":
+            for update in event.get("updates", []):
+                change(update["movie_id"], update["changes"])
+            for movie_id in event.get("deleted", []):
+                delete(movie_id)
+        elif event_type == "movie_deleted":
+            delete(event["movie_id"])
+        elif event_type == "user_updated":
+            users[event["user"]["id"]] = event["user"]
+        else:
+            change(event["movie_id"], event["changes"])
+
+    merged = {
+        "type": "movies_changed",
+        "added": list(added.values()),
+        "updates": [{"movie_id": movie_id, "changes": c} for movie_id, c in updated.items()],
+        "deleted": list(deleted),
+        "users": list(users.values()),
+        "since": min(event["version"] for event in changes) - 1,
+        "version": max(event["version"] for event in changes),
+    }
+    last = changes[-1]
+    return [merged if event is last else event for event in events if event is last or "version" not in event]
+
+
+class EventBroker:
+    """Fans SSE events out to the clients connected to this process, with a replay buffer.
+
+    Events published within coalesce_window of each other are sent as one frame, a JSON
+    array of events with the movie changes merged (see coalesce()). Frames are numbered
+    in the order they are sent and the last history of them are kept in a ring buffer.
+    Subscribers don't get a queue of their own, only a position in the buffer, so a
+    slow client falls behind and catches up from there instead of being dropped. A
+    client reconnecting with Last-Event-ID is sent just the frames it missed, or a
+    resync event when the buffer no longer reaches back that far.
+
+    Event ids are "<node>-<n>" with a node drawn at startup, so they are unique across
+    processes; a frame goes out with the id of its last event. Brokers fed the same
+    events in the same order with the same ids (see broadcast.py) can resume each
+    other's clients, even when they grouped the events differently: a client resuming
+    from an event in the middle of a frame gets that whole frame again. An id a broker
+    doesn't know, e.g. one from before a restart, is answered with a resync.
+
+    Heartbeats come from one ticker started by start(), not a timer per client.
+    """
+
+    def __init__(
+            self,
+            history: int = EVENT_HISTORY_SIZE,
+            ping_interval: float = SSE_PING_INTERVAL,
+            coalesce_window: float = SSE_COALESCE_WINDOW,
+    ):
+        self.node = secrets.token_hex(4)
+        self.history = history
+        self.ping_interval = ping_interval
+        self.coalesce_window = coalesce_window
+        self.last_seq = 0
+        self._ids = itertools.count(1)
+        # (seq, ids of the events in it, payload) of the latest frames
+        self._history: deque[tuple[int, list[str], str]] = deque()
+        self._positions: dict[str, int] = {}
+        # Last event id of the latest frame to leave the buffer; clients that got all of
+        # it can still resume, since everything after it is buffered
+        self._evicted_id: str | None = None
+        # Position clients start from before any event, or after a resync()
+        self._origin = (f"{self.node}-0", 0)
+        # Events waiting for the end of the coalescing window
+        self._pending: list[tuple[str, dict]] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._ticker: asyncio.Task | None = None
+        self._pings = 0
+        # Wake-up event of every subscriber, with the seq of the last frame sent to it
+        self._subscribers: dict[asyncio.Event, int] = {}
+        self._closed = False
+
+    @property
+    def clients(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def pending(self) -> int:
+        """Events waiting for the coalescing window to close."""
+        return len(self._pending)
+
+    @property
+    def max_lag(self) -> int:
+        """Frames the furthest behind subscriber has yet to be sent."""
+        return self.last_seq - min(self._subscribers.values(), default=self.last_seq)
+
+    @property
+    def latest_id(self) -> str:
+        return self._history[-1][1][-1] if self._history else self._origin[0]
+
+    def next_event_id(self) -> str:
+        return f"{self.node}-{next(self._ids)}"
+
+    def position(self, event_id: str) -> int | None:
+        """Sequence number of a known event id, else None."""
+        if event_id == self._origin[0]:
+            return self._origin[1]
+        return self._positions.get(event_id)
+
+    def start(self) -> None:
+        self._ticker = asyncio.create_task(self._tick())
+
+    def publish(self, event: dict, event_id: str | None = None) -> str:
+        """Queue event for the next frame. Returns its id."""
+        event_id = event_id or self.next_event_id()
+        self._pending.append((event_id, event))
+        SSE_EVENTS.inc()
+        if self.coalesce_window <= 0:
+            self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.coalesce_window, self.flush)
+        return event_id
+
+    def flush(self) -> None:
+        """Send the pending events as one frame and wake every subscriber."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        event_ids = [event_id for event_id, _event in self._pending]
+        payload = dumps(coalesce([event for _event_id, event in self._pending])).decode()
+        self._pending = []
+
+        self.last_seq += 1
+        self._history.append((self.last_seq, event_ids, payload))
+        for event_id in event_ids[:-1]:
+            self._positions[event_id] = self.last_seq - 1
+        self._positions[event_ids[-1]] = self.last_seq
+        if len(self._history) > self.history:
+            _seq, evicted, _payload = self._history.popleft()
+            for event_id in evicted[:-1]:
+                del self._positions[event_id]
+            if self._evicted_id is not None:
+                del self._positions[self._evicted_id]
+            self._evicted_id = evicted[-1]
+        SSE_FRAMES.inc()
+        self._wake()
+
+    def resync(self) -> None:
+        """Send every subscriber a resync, for when events may have been lost."""
+        self.last_seq += 1
+        self._history.clear()
+        self._positions.clear()
+        self._evicted_id = None
+        self._origin = (f"{self.node}-0.{self.last_seq}", self.last_seq)
+        self._wake()
+
+    def close(self) -> None:
+        """End every subscription, for shutdown."""
+        self._closed = True
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        if self._ticker is not None:
+            self._ticker.cancel()
+        self._wake()
+
+    async def _tick(self) -> None:
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            self._pings += 1
+            self._wake()
+
+    def _wake(self) -> None:
+        for wakeup in self._subscribers:
+            wakeup.set()
+
+    def _frames_after(self, seq: int) -> list[tuple[int, list[str], str]] | None:
+        """Buffered frames following seq, or None if some of them are gone."""
+        if seq == self.last_seq:
+            return []
+        oldest = self._history[0][0] if self._history else self.last_seq + 1
+        if seq + 1 < oldest:
+            return None
+        return list(itertools.islice(self._history, seq + 1 - oldest, None))
+
+    async def subscribe(self, last_event_id: str | None) -> AsyncIterator[dict]:
+        """Yield the SSE messages for one client until the broker closes. A client that
+        disconnects is noticed by the response, which stops iterating.
+
+        Without last_event_id the client starts at the newest frame. Pings carry the
+        current position as their id, so even a client that saw no events resumes from
+        the right place.
+        """
+        seq = self.position(last_event_id) if last_event_id else self.last_seq
+        event_id = last_event_id if last_event_id else self.latest_id
+        if seq is None:
+            SSE_RESYNCS.inc("unknown_id")
+            seq, event_id = self.last_seq, self.latest_id
+            yield {"event": "resync", "id": event_id, "data": ""}
+
+        wakeup = asyncio.Event()
+        self._subscribers[wakeup] = seq
+        pings = self._pings
+        try:
+            if seq == self.last_seq:
+                yield {"event": "ping", "id": event_id, "data": ""}
+            while not self._closed:
+                wakeup.clear()
+                missed = self._frames_after(seq)
+                if missed is None:
+                    SSE_RESYNCS.inc("gap")
+                    seq, event_id = self.last_seq, self.latest_id
+                    self._subscribers[wakeup] = seq
+                    yield {"event": "resync", "id": event_id, "data": ""}
+                    continue
+                for seq, event_ids, payload in missed:
+                    event_id = event_ids[-1]
+                    yield {"event": "movie_update", "id": event_id, "data": payload}
+                    self._subscribers[wakeup] = seq
+                if missed:
+                    pings = self._pings
+                    continue
+
+                if pings != self._pings:
+                    pings = self._pings
+                    yield {"event": "ping", "id": event_id, "data": ""}
+                await wakeup.wait()
+        finally:
+            self._subscribers.pop(wakeup, None)
+
+
+event_broker = EventBroker()
+
+Gauge("movienite_sse_clients", "Connected SSE clients", function=lambda: event_broker.clients)
+Gauge("movienite_sse_pending_events", "Events waiting for the coalescing window to close",
+      function=lambda: event_broker.pending)
+Gauge("movienite_sse_max_client_lag_frames", "Frames the furthest behind SSE client has yet to be sent",
+      function=lambda: event_broker.max_lag)
@@ -0,0 +1,82 @@
+import gzip
+
+import brotli
+import orjson
+from fastapi.responses import Response
+
+# Bodies smaller than this are not worth the compression overhead
+MIN_COMPRESS_SIZE = 1024
+
+# Preferred first; the browser usually accepts both
+SUPPORTED_ENCODINGS = ('br', 'gzip')
+
+
+def dumps(payload) -> bytes:
+    """Serialize straight to UTF-8 bytes, skipping FastAPI's jsonable_encoder pass."""
+    return orjson.dumps(payload)
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    """Pick the best supported content coding from an Accept-Encoding header."""
+    if not accept_encoding:
+        return None
+
+    accepted = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    for encoding in SUPPORTED_ENCODINGS:
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str, *, level: int = 5) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=level)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=level)
+    raise ValueError(f'Unsupported encoding: {encoding}')
+
+
+def choose_encoding(body: bytes, accept_encoding: str | None) -> str | None:
+    """Content coding to send body with, or None to send it as is."""
+    if len(body) < MIN_COMPRESS_SIZE:
+        return None
+    return negotiate_encoding(accept_encoding)
+
+
+def encoded_etag(etag: str, encoding: str | None) -> str:
+    """ETag of a compressed variant; strong validators must differ per content coding."""
+    if not encoding:
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def json_response(
+        body: bytes,
+        encoding: str | None,
+        *,
+        headers: dict | None = None,
+        compressed_body: bytes | None = None,
+        status_code: int = 200,
+) -> Response:
+    """Build a JSON response from pre-serialized bytes, compressed with the given encoding.
+
+    compressed_body, when given, is body already compressed with that encoding.
+    """
+    headers = {**(headers or {}), 'Vary': 'Accept-Encoding'}
+
+    if encoding:
+        body = compressed_body if compressed_body is not None else compress(body, encoding)
+        headers['Content-Encoding'] = encoding
+
+    return Response(content=body, status_code=status_code, media_type='application/json', headers=headers)
@@ -1,5 +1,6 @@
 import { type Component, createEffect, createSignal, Show } from "solid-js";
 import { api } from "@/utils/api";
+import { waitForJob } from "@/hooks/jobStore";
 
 interface AddMovieModalProps {
   isOpen: boolean;
@@ -47,7 +48,11 @@ export const AddMovieModal: Component<AddMovieModalProps> = (props) => {
     }
 
     try {
-      await api.addMovie(movieUrl);
+      const { job_id } = await api.addMovie(movieUrl);
+      const job = await waitForJob(job_id);
+      if (job.status === "failed") {
+        throw new Error(job.error || "Failed to add movie");
+      }
       props.onClose();
       form.reset();
       props.onMovieAdded();
@@ -0,0 +1,65 @@
+import { api } from "@/utils/api";
+import type { Job, JobStatus, MovieEvent } from "@/types";
+
+const POLL_INTERVAL_MS = 3000;
+// Adding a movie takes seconds; after this long, stop waiting and report a failure
+const WAIT_TIMEOUT_MS = 5 * 60 * 1000;
+
+const waiters = new Map<string, ((job: Job) => void)[]>();
+
+const isFinished = (status: JobStatus) =>
+  status === "succeeded" || status === "failed";
+
+/** Fetch the job and, if it has finished, hand it to everyone waiting for it. */
+const collect = async (jobId: string) => {
+  // null when the request failed or this server doesn't know the job (yet);
+  // the next poll or event tries again
+  const job = await api.getJob(jobId).catch(() => null);
+  if (job === null || !isFinished(job.status)) return;
+  waiters.get(jobId)?.forEach((resolve) => resolve(job));
+  waiters.delete(jobId);
+};
+
+/** Handle a job_succeeded / job_failed event pushed over SSE. */
+export const applyJobEvent = (event: MovieEvent) => {
+  if (event.job && isFinished(event.job.status) && waiters.has(event.job.id)) {
+    void collect(event.job.id);
+  }
+};
+
+const failedJob = (jobId: string, error: string): Job => ({
+  id: jobId,
+  kind: "",
+  status: "failed",
+  created_at: "",
+  finished_at: null,
+  result: null,
+  error,
+});
+
+/**
+ * Resolves once the job has finished. Completion normally arrives over
+ * SSE; polling covers events missed while the stream was reconnecting, and
+ * jobs that finished before the wait started. A job the server doesn't
+ * know is waited for all the same, until WAIT_TIMEOUT_MS, after which it
+ * resolves as failed.
+ */
+export const waitForJob = (jobId: string) =>
+  new Promise<Job>((resolve) => {
+    const timer = setInterval(() => void collect(jobId), POLL_INTERVAL_MS);
+
+    const timeout = setTimeout(() => {
+      const remaining = (waiters.get(jobId) ?? []).filter((waiter) => waiter !== done);
+      if (remaining.length) waiters.set(jobId, remaining);
+      else waiters.delete(jobId);
+      done(failedJob(jobId, "Timed out waiting for the job to finish"));
+    }, WAIT_TIMEOUT_MS);
+
+    const done = (job: Job) => {
+      clearInterval(timer);
+      clearTimeout(timeout);
+      resolve(job);
+    };
+    waiters.set(jobId, [...(waiters.get(jobId) ?? []), done]);
+    void collect(jobId);
+  });
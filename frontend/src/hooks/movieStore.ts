@@ -1,15 +1,18 @@
-import { createStore } from "solid-js/store";
+import { createStore, produce } from "solid-js/store";
 import { api } from "@/utils/api";
-import type { Movie } from "@/types";
+import type { Movie, MovieEvent } from "@/types";
 
 interface MovieStore {
   movies: Movie[];
+  /** Server data version the movie list reflects. */
+  version: number | null;
   loading: boolean;
   error: string | null;
 }
 
 const [movieStore, setMovieStore] = createStore<MovieStore>({
   movies: [],
+  version: null,
   loading: false,
   error: null,
 });
@@ -18,6 +21,9 @@ export const setLoading = (loading: boolean) =>
   setMovieStore("loading", loading);
 export const setError = (error: string | null) => setMovieStore("error", error);
 
+// Events that arrive while a fetch is in flight, replayed on top of its result
+let pendingEvents: MovieEvent[] = [];
+
 export const fetchMovies = async () => {
   if (movieStore.loading) return;
 
@@ -26,18 +32,146 @@ export const fetchMovies = async () => {
   let data = [] as Movie[];
 
   try {
-    data = await api.getMovies();
+    const result = await api.getMovies();
+    data = result.movies;
     setMovies(data);
-    return data;
+    setMovieStore("version", result.version);
     // eslint-disable-next-line @typescript-eslint/no-explicit-any
   } catch (err: any) {
     setError(err.message || "Unknown error");
   } finally {
     setLoading(false);
   }
+
+  // Events the fetched list already includes would look like they came from
+  // before a server restart
+  const fetched = movieStore.version;
+  const queued = pendingEvents.filter(
+    (event) => fetched === null || (event.version ?? 0) > fetched,
+  );
+  pendingEvents = [];
+  queued.forEach(applyMovieEvent);
   return data;
 };
 
+const patchMovies = (event: MovieEvent) => {
+  setMovieStore(
+    "movies",
+    produce((movies) => {
+      switch (event.type) {
+        case "movie_added": {
+          const added = event.movie;
+          if (!added) return;
+          const index = movies.findIndex((m) => m.id === added.id);
+          if (index === -1) movies.push(added);
+          else movies[index] = added;
+          return;
+        }
+        case "movies_added": {
+          for (const added of event.movies ?? []) {
+            const index = movies.findIndex((m) => m.id === added.id);
+            if (index === -1) movies.push(added);
+            else movies[index] = added;
+          }
+          return;
+        }
+        case "movies_updated": {
+          for (const update of event.updates ?? []) {
+            const movie = movies.find((m) => m.id === update.movie_id);
+            if (movie) Object.assign(movie, update.changes);
+          }
+          const deleted = new Set(event.deleted ?? []);
+          if (deleted.size) {
+            for (let i = movies.length - 1; i >= 0; i--) {
+              if (deleted.has(movies[i].id)) movies.splice(i, 1);
+            }
+          }
+          return;
+        }
+        case "movies_changed": {
+          const deleted = new Set(event.deleted ?? []);
+          for (let i = movies.length - 1; i >= 0; i--) {
+            if (deleted.has(movies[i].id)) movies.splice(i, 1);
+          }
+          for (const added of event.added ?? []) {
+            const index = movies.findIndex((m) => m.id === added.id);
+            if (index === -1) movies.push(added);
+            else movies[index] = added;
+          }
+          for (const update of event.updates ?? []) {
+            const movie = movies.find((m) => m.id === update.movie_id);
+            if (movie) Object.assign(movie, update.changes);
+          }
+          for (const user of event.users ?? []) {
+            for (const movie of movies) {
+              if (movie.user && movie.user.id === user.id) {
+                Object.assign(movie.user, user);
+              }
+            }
+          }
+          return;
+        }
+        case "movie_deleted": {
+          const index = movies.findIndex((m) => m.id === event.movie_id);
+          if (index !== -1) movies.splice(index, 1);
+          return;
+        }
+        case "user_updated": {
+          for (const movie of movies) {
+            if (movie.user && event.user && movie.user.id === event.user.id) {
+              Object.assign(movie.user, event.user);
+            }
+          }
+          return;
+        }
+        default: {
+          const movie = movies.find((m) => m.id === event.movie_id);
+          if (movie && event.changes) Object.assign(movie, event.changes);
+        }
+      }
+    }),
+  );
+};
+
+/**
+ * Apply a change pushed by the server. Events patch the store in place when
+ * they directly follow the version we hold (merged events when they start at
+ * or before it, as they carry end states); after a gap (missed events) or a
+ * version older than ours (server restart) the full list is refetched instead.
+ */
+export const applyMovieEvent = (event: MovieEvent) => {
+  if (event.version === undefined) return;
+
+  if (movieStore.loading) {
+    pendingEvents.push(event);
+    return;
+  }
+
+  const current = movieStore.version;
+  if (current !== null && event.version === current) return;
+
+  // The server restarted and counts versions from 0 again
+  if (current !== null && event.version < current) {
+    void fetchMovies();
+    return;
+  }
+
+  // Changes made outside the API, e.g. by a CSV import, aren't itemized
+  if (event.type === "movies_reloaded") {
+    void fetchMovies();
+    return;
+  }
+
+  const since = event.since ?? event.version - 1;
+  if (current === null || current < since) {
+    void fetchMovies();
+    return;
+  }
+
+  patchMovies(event);
+  setMovieStore("version", event.version);
+};
+
 void fetchMovies();
 
 export default movieStore;
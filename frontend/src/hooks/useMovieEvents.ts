@@ -1,17 +1,30 @@
 import { onCleanup } from "solid-js";
-import { fetchMovies } from "@/hooks/movieStore";
+import { applyMovieEvent, fetchMovies } from "@/hooks/movieStore";
+import { applyJobEvent } from "@/hooks/jobStore";
+import type { MovieEvent } from "@/types";
 
 /**
- * Connects to the backend SSE endpoint and refetches movies
- * whenever a movie_update event is received.
+ * Connects to the backend SSE endpoint, patches the movie store
+ * with the changes carried by every movie_update frame and settles
+ * background jobs that finished. A frame is an array of events the
+ * server coalesced over a short window.
  *
  * Automatically reconnects on connection loss (the browser's
- * built-in EventSource handles this).
+ * built-in EventSource handles this). The server replays the events
+ * missed in between, or sends a resync when it can't, and the list
+ * is refetched.
  */
 export function useMovieEvents() {
   const eventSource = new EventSource("/api/events");
 
-  eventSource.addEventListener("movie_update", () => {
+  eventSource.addEventListener("movie_update", (e: MessageEvent<string>) => {
+    for (const event of JSON.parse(e.data) as MovieEvent[]) {
+      applyJobEvent(event);
+      applyMovieEvent(event);
+    }
+  });
+
+  eventSource.addEventListener("resync", () => {
     void fetchMovies();
   });
 
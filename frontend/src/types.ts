@@ -19,3 +19,47 @@ export interface Movie {
     discord_id?: string;
   };
 }
+
+export interface MovieUser {
+  id: string;
+  username: string;
+  avatar_url?: string;
+  discord_id?: string;
+}
+
+export type JobStatus = "queued" | "running" | "succeeded" | "failed";
+
+export interface Job {
+  id: string;
+  kind: string;
+  status: JobStatus;
+  created_at: string;
+  finished_at: string | null;
+  result: Record<string, unknown> | null;
+  error: string | null;
+}
+
+/** Payload of a `movie_update` SSE event. */
+export interface MovieEvent {
+  type: string;
+  /** Data version after this change; absent on events that don't touch movies. */
+  version?: number;
+  /** Version the change applies on top of, when it spans several versions. */
+  since?: number;
+  movie_id?: string;
+  movie?: Movie;
+  /** Movies added together by a bulk import. */
+  movies?: Movie[];
+  changes?: Partial<Movie>;
+  /** Per-movie changes, for events that touch many movies at once. */
+  updates?: { movie_id: string; changes: Partial<Movie> }[];
+  /** Ids of movies removed by the same change. */
+  deleted?: string[];
+  /** Movies added, for merged movies_changed events. */
+  added?: Movie[];
+  /** Users whose details changed, for merged movies_changed events. */
+  users?: MovieUser[];
+  user?: MovieUser;
+  /** Set on job_succeeded / job_failed; the job itself is fetched by id. */
+  job?: { id: string; status: JobStatus };
+}
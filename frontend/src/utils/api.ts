@@ -1,5 +1,5 @@
 import type { User } from "@/hooks/authStore";
-import type { Movie } from "@/types";
+import type { Job, Movie } from "@/types";
 
 export const api = {
   // Auth endpoints
@@ -30,16 +30,16 @@ export const api = {
   },
 
   // Movie endpoints
-  async getMovies(): Promise<Movie[]> {
+  async getMovies(): Promise<{ movies: Movie[]; version: number | null }> {
     const response = await fetch(`/api/movies`);
     if (!response.ok) {
       throw new Error(`Failed to load movies: ${response.status}`);
     }
     const data = await response.json();
-    return data.movies || [];
+    return { movies: data.movies || [], version: data.version ?? null };
   },
 
-  async addMovie(movieUrl: string) {
+  async addMovie(movieUrl: string): Promise<{ job_id: string }> {
     const response = await fetch(`/api/movies`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
@@ -48,7 +48,27 @@ export const api = {
     if (!response.ok) {
       throw new Error("Failed to add movie");
     }
-    return response.json();
+    const data = await response.json();
+    if (data.error) {
+      throw new Error(data.error);
+    }
+    return data;
+  },
+
+  /**
+   * The job, or null if the server doesn't know it: it may have been lost in a
+   * restart, or it is still queued on another worker, which saves it only once
+   * it starts.
+   */
+  async getJob(jobId: string): Promise<Job | null> {
+    const response = await fetch(`/api/jobs/${jobId}`);
+    if (response.status === 404) {
+      return null;
+    }
+    if (!response.ok) {
+      throw new Error(`Failed to get job: ${response.status}`);
+    }
+    return (await response.json()) as Job;
   },
 
   async toggleWatch(movieId: string) {
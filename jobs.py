@@ -0,0 +1,152 @@
+import asyncio
+import datetime
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+from database.db import delete_finished_jobs, save_job
+
+logger = logging.getLogger("uvicorn.error")
+
+# Finished jobs stay in the shared jobs table this long
+JOB_RETENTION = datetime.timedelta(hours=float(os.getenv("JOB_RETENTION_HOURS", "24")))
+# Old jobs are deleted from the table once every this many finished jobs
+JOB_SWEEP_INTERVAL = int(os.getenv("JOB_SWEEP_INTERVAL", "100"))
+
+
+class JobFailed(Exception):
+    """Raised by a job to fail with a message that is safe to show to users."""
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    key: str
+    status: str = 'queued'  # queued | running | succeeded | failed
+    created_at: datetime.datetime = field(default_factory=lambda: datetime.datetime.now(datetime.UTC))
+    finished_at: datetime.datetime | None = None
+    result: dict | None = None
+    error: str | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('succeeded', 'failed')
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+class JobQueue:
+    """Bounded queue of background jobs run by a fixed pool of workers.
+
+    Jobs are deduplicated by key: submitting a key that is already queued or running
+    returns the existing job instead of starting a second one. Finished jobs are kept
+    for status queries, up to max_finished of them.
+
+    Jobs are also written to the jobs table once they start and when they finish, so
+    other API workers can look them up (database.db.get_saved_job). Finished ones are
+    deleted from it after JOB_RETENTION.
+    """
+
+    def __init__(
+            self,
+            kind: str,
+            workers: int,
+            max_queued: int,
+            max_finished: int = 500,
+            on_finished: Callable[[Job], Awaitable[None]] | None = None,
+    ):
+        self.kind = kind
+        self.workers = workers
+        self.max_finished = max_finished
+        self.on_finished = on_finished
+        self._queue: asyncio.Queue[tuple[Job, Callable[[], Awaitable[dict]]]] = asyncio.Queue(maxsize=max_queued)
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._in_flight: dict[str, Job] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._finished_count = 0
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, key: str, run: Callable[[], Awaitable[dict]]) -> tuple[Job, bool]:
+        """Queue run() under key. Returns (job, created); created is False when an
+        in-flight job with the same key was reused. Raises asyncio.QueueFull when the
+        queue is at capacity."""
+        existing = self._in_flight.get(key)
+        if existing is not None:
+            return existing, False
+
+        job = Job(id=uuid.uuid4().hex, kind=self.kind, key=key)
+        self._queue.put_nowait((job, run))
+        self._in_flight[key] = job
+        self._jobs[job.id] = job
+        return job, True
+
+    def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    async def _save(self, job: Job) -> None:
+        try:
+            await save_job(vars(job))
+        except Exception as e:
+            logger.error(f"Could not save {self.kind} job {job.id}: {e}")
+
+    async def _worker(self) -> None:
+        while True:
+            job, run = await self._queue.get()
+            job.status = 'running'
+            await self._save(job)
+            try:
+                job.result = await run()
+                job.status = 'succeeded'
+            except JobFailed as e:
+                job.error = str(e)
+                job.status = 'failed'
+            except Exception as e:
+                logger.error(f"{self.kind} job {job.id} crashed: {e}")
+                job.error = 'Internal error'
+                job.status = 'failed'
+            finally:
+                job.finished_at = datetime.datetime.now(datetime.UTC)
+                self._in_flight.pop(job.key, None)
+                self._forget_old_jobs()
+                self._queue.task_done()
+
+            # Saved before it is reported, so any worker can answer for it by then
+            await self._save(job)
+            self._finished_count += 1
+            if self._finished_count % JOB_SWEEP_INTERVAL == 0:
+                try:
+                    await delete_finished_jobs(JOB_RETENTION)
+                except Exception as e:
+                    logger.error(f"Could not delete old {self.kind} jobs: {e}")
+
+            if self.on_finished is not None:
+                try:
+                    await self.on_finished(job)
+                except Exception as e:
+                    logger.error(f"Could not report {self.kind} job {job.id}: {e}")
+
+    def _forget_old_jobs(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
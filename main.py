@@ -1,82 +1,120 @@
 import asyncio
+import csv
 import datetime
-import json
+import hashlib
+import io
 import logging
 import os
+import re
 from contextlib import asynccontextmanager
+from typing import Literal
 from urllib.parse import urlparse, urlunparse
 
-import jwt
 import tldextract
 import uvicorn
 from dotenv import load_dotenv
-from fastapi import FastAPI, Cookie, Request
+from fastapi import FastAPI, Depends, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse, JSONResponse, Response
-from jwt import InvalidTokenError
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, ValidationError, model_validator
 from sse_starlette.sse import EventSourceResponse
 
-from data import NewUser
-from database.db import add_movie as _add_movie, get_movies, add_user, get_user_by_mail
-from database.db import get_movie_by_id, delete_movie, toggle_movie_watched, toggle_movie_boobies
-from discord_oauth import get_oauth_url, get_access_token, get_discord_user
-from movienite import fetch_imdb, fetch_letterboxd, fetch_boxd
+from auth import AuthError, SessionRenewalMiddleware, create_session_jwt, current_user, optional_user, user_cache
+from auth import set_session_cookie
+from data import MutationOutcome, NewUser
+from database.db import add_movie as _add_movie, get_movies, add_user, open_pool, close_pool
+from database.db import get_movie, delete_movie, toggle_movie_watched, toggle_movie_boobies, run_movie_actions
+from broadcast import create_broadcast
+from database.db import search_movies, add_movies, get_movies_by_ids, get_saved_job
+from events import event_broker
+from discord_oauth import get_oauth_url, get_access_token, get_discord_user, close_client as close_discord_client
+from fast_json import dumps, json_response, choose_encoding, encoded_etag
+from jobs import Job, JobFailed, JobQueue
+from metrics import Histogram, MetricsMiddleware, render as render_metrics
+from movie_cache import movies_cache, etag_matches
+from movienite import fetch_imdb, fetch_letterboxd, fetch_boxd, close_client as close_scraper_client
+from rating_refresher import RatingRefresher, RATING_REFRESH_ENABLED
 
 load_dotenv()
 
-JWT_SECRET = os.getenv("JWT_SECRET")
-JWT_ALGORITHM = "HS256"
-JWT_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
-
 logger = logging.getLogger("uvicorn.error")
 
 VALID_MOVIE_SITES = ['imdb.com', 'letterboxd.com', 'boxd.it']
 
-sse_clients: set[asyncio.Queue] = set()
+MAX_MOVIES_PAGE_SIZE = 200
+MAX_SEARCH_RESULTS = 50
+
+ADD_MOVIE_WORKERS = int(os.getenv("ADD_MOVIE_WORKERS", "4"))
+ADD_MOVIE_MAX_QUEUED = int(os.getenv("ADD_MOVIE_MAX_QUEUED", "100"))
+
+MAX_IMPORT_ITEMS = int(os.getenv("MAX_IMPORT_ITEMS", "1000"))
+# Movies scraped at once per import; movienite's per-host rate limit still applies
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", "8"))
+
+SSE_STARLETTE_PING = 24 * 60 * 60
+
+broadcast = create_broadcast(event_broker, movies_cache)
 
 
 async def broadcast_event(event_type: str, data: dict | None = None):
     """Send an SSE event to all connected clients."""
-    payload = json.dumps({"type": event_type, **(data or {})})
-    disconnected: list[asyncio.Queue] = []
-    for queue in sse_clients:
-        try:
-            queue.put_nowait(payload)
-        except asyncio.QueueFull:
-            disconnected.append(queue)
-    for q in disconnected:
-        sse_clients.discard(q)
+    await broadcast.publish(event_type, data)
+
+
+async def broadcast_movie_change(event_type: str, data: dict):
+    """Invalidate the /movies cache and tell clients exactly what changed.
+
+    Events carry the new data version. A client whose copy is at version - 1 can
+    patch itself with the event, anyone else has missed something and refetches.
+    """
+    await broadcast.publish(event_type, data, movie_change=True)
+
+
+async def announce_refreshed_ratings(updates: list[dict]):
+    await broadcast_movie_change("movies_updated", {"updates": updates})
+
+
+rating_refresher = RatingRefresher(on_refreshed=announce_refreshed_ratings)
 
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI):
     logger.info("Application starting up")
+    await open_pool()
+    await broadcast.start()
+    event_broker.start()
+    add_movie_jobs.start()
+    import_jobs.start()
+    if RATING_REFRESH_ENABLED:
+        rating_refresher.start()
     yield
     logger.info("Application shutting down")
     # Close all SSE connections on shutdown
-    for queue in sse_clients:
-        await queue.put(None)
-    sse_clients.clear()
-
+    event_broker.close()
+    await add_movie_jobs.stop()
+    await import_jobs.stop()
+    await rating_refresher.stop()
+    await close_scraper_client()
+    await close_discord_client()
+    await broadcast.stop()
+    await close_pool()
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "movienite_http_request_seconds",
+    "Time to handle HTTP requests, by method, route and status",
+    ["method", "route", "status"],
+)
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(SessionRenewalMiddleware)
+# The event stream stays open for as long as a client is connected
+app.add_middleware(MetricsMiddleware, histogram=HTTP_REQUEST_SECONDS, untimed=["/events"])
 
 
-def create_session_jwt(*, discord_access_token: str, discord_refresh_token: str, email: str) -> str:
-    payload = {
-        "sub": "discord_session",
-        "email": email,
-        "discord_access_token": discord_access_token,
-        "discord_refresh_token": discord_refresh_token,
-        "exp": datetime.datetime.now(datetime.UTC) + datetime.timedelta(minutes=JWT_EXPIRE_MINUTES),
-    }
-
-    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
-
-
-def decode_session_jwt(token: str):
-    return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+@app.exception_handler(AuthError)
+async def auth_error_handler(_request: Request, exc: AuthError):
+    return JSONResponse(status_code=exc.status_code, content={"error": exc.message})
 
 
 @app.get("/login")
@@ -91,9 +129,9 @@ async def logout(response: Response):
 
 @app.get("/callback")
 async def callback(code: str):
-    discord_access_token, discord_refresh_token = get_access_token(code)
+    discord_access_token, discord_refresh_token = await get_access_token(code)
 
-    discord_user_info = get_discord_user(discord_access_token)
+    discord_user_info = await get_discord_user(discord_access_token)
     email = discord_user_info['email']
 
     session_jwt = create_session_jwt(
@@ -103,13 +141,7 @@ async def callback(code: str):
     )
 
     response = RedirectResponse(url="/")
-    response.set_cookie(
-        key="session_token",
-        value=session_jwt,
-        httponly=True,
-        max_age=JWT_EXPIRE_MINUTES * 60,
-        samesite="lax",
-    )
+    set_session_cookie(response, session_jwt)
 
     user = NewUser(
         username=discord_user_info['username'],
@@ -120,70 +152,94 @@ async def callback(code: str):
         is_admin=False
     )
 
-    add_user(user)
+    saved_user = await add_user(user)
+    user_cache.invalidate(email)
+    # Usernames and avatars are part of the /movies payload
+    await broadcast_movie_change("user_updated", {"user": {
+        "id": saved_user.id,
+        "username": saved_user.username,
+        "avatar_url": saved_user.avatar_url,
+        "discord_id": saved_user.discord_id,
+    }})
 
     return response
 
 
 @app.get("/user")
-async def get_user(session_token: str | None = Cookie(None)):
-    if not session_token:
-        logger.info("No session cookie found")
-        return JSONResponse(status_code=401, content={"error": "Not authenticated"})
-
-    try:
-        payload = decode_session_jwt(session_token)
-        email = payload['email']
-        if not email:
-            raise ValueError("Email not found in token")
-    except (InvalidTokenError, ValueError) as e:
-        logger.error(f"Invalid session token: {e}")
-        return JSONResponse(status_code=401, content={"error": "Invalid session"})
-
-    user = get_user_by_mail(email)
-    if not user:
-        logger.error(f"User with email {email} not found")
-        return JSONResponse(status_code=404, content={"error": "User not found"})
-
+async def get_user(user: dict = Depends(current_user)):
     return user
 
 
 @app.get("/events")
-async def sse_events(request: Request):
-    queue: asyncio.Queue = asyncio.Queue(maxsize=64)
-    sse_clients.add(queue)
+async def sse_events(last_event_id: str | None = Header(None)):
+    """Stream movie_update frames. Reconnecting clients get what they missed replayed
+    from last_event_id, or a resync event telling them to refetch."""
+    # Pings come from the broker's shared ticker; sse_starlette's own per-connection
+    # ping is pushed out of the way (ping=0 only disables it on recent versions)
+    return EventSourceResponse(event_broker.subscribe(last_event_id), ping=SSE_STARLETTE_PING)
 
-    async def event_generator():
-        try:
-            while True:
-                if await request.is_disconnected():
-                    break
-                try:
-                    payload = await asyncio.wait_for(queue.get(), timeout=30)
-                except asyncio.TimeoutError:
-                    yield {"event": "ping", "data": ""}
-                    continue
-                if payload is None:
-                    break
-                yield {"event": "movie_update", "data": payload}
-        finally:
-            sse_clients.discard(queue)
-
-    return EventSourceResponse(event_generator())
+
+@app.get("/metrics")
+async def metrics():
+    """Metrics in the Prometheus text format."""
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.get("/movies")
-async def movies():
-    return get_movies()
+async def movies(
+        watched: bool | None = None,
+        user_id: int | None = None,
+        boobies: bool | None = None,
+        sort: Literal['title', 'rating', 'votes', 'inserted_at'] = 'title',
+        direction: Literal['asc', 'desc'] = 'asc',
+        limit: int | None = Query(None, ge=1, le=MAX_MOVIES_PAGE_SIZE),
+        cursor: str | None = None,
+        if_none_match: str | None = Header(None),
+        accept_encoding: str | None = Header(None),
+):
+    key = (watched, user_id, boobies, sort, direction, limit, cursor)
+
+    async def build():
+        return await get_movies(
+            watched=watched,
+            user_id=user_id,
+            boobies=boobies,
+            sort=sort,
+            direction=direction,
+            limit=limit,
+            cursor=cursor,
+        )
+
+    try:
+        cached = await movies_cache.get(key, build)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    encoding = choose_encoding(cached.body, accept_encoding)
+    etag = encoded_etag(cached.etag, encoding)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={**headers, "Vary": "Accept-Encoding"})
+    compressed_body = await movies_cache.compressed(cached, encoding) if encoding else None
+    return json_response(cached.body, encoding, headers=headers, compressed_body=compressed_body)
+
+
+@app.get("/movies/search")
+async def movie_search(
+        q: str = Query(..., min_length=1, max_length=200),
+        limit: int = Query(20, ge=1, le=MAX_SEARCH_RESULTS),
+        accept_encoding: str | None = Header(None),
+):
+    body = dumps(await search_movies(q, limit))
+    return json_response(body, choose_encoding(body, accept_encoding))
 
 
 class AddMovieRequest(BaseModel):
     movie_url: str
 
 
-@app.post("/movies")
-async def add_new_movie(request: AddMovieRequest, session_token: str | None = Cookie(None)):
-    movie_url = request.movie_url
+def clean_movie_url(movie_url: str) -> tuple[str, str]:
+    """Normalize a pasted movie URL. Returns (cleaned_url, host)."""
     if not movie_url.startswith("http://") and not movie_url.startswith("https://"):
         logger.warning("URL missing scheme, adding https://")
         movie_url = "https://" + movie_url
@@ -193,169 +249,331 @@ async def add_new_movie(request: AddMovieRequest, session_token: str | None = Co
 
     host = f"{ext.domain}.{ext.suffix}"
     parsed_url = parsed_url._replace(netloc=host)
-    cleaned_url = urlunparse(parsed_url)
+    return urlunparse(parsed_url), host
+
 
+def movie_job_key(cleaned_url: str, host: str) -> str:
+    """Key that identifies the same movie across different spellings of its URL."""
+    if host == "imdb.com" and (match := re.search(r"/title/(tt\d+)", cleaned_url)):
+        return f"imdb:{match.group(1)}"
+    if host == "letterboxd.com" and (match := re.search(r"/film/([^/?#]+)", cleaned_url)):
+        return f"letterboxd:{match.group(1)}"
+    return cleaned_url
+
+
+async def scrape_movie(cleaned_url: str, host: str) -> dict | None:
     if host == "imdb.com":
-        movie_data = fetch_imdb(cleaned_url)
-    elif host == "letterboxd.com":
-        movie_data = fetch_letterboxd(cleaned_url)
-    elif host == "boxd.it":
-        movie_data = fetch_boxd(cleaned_url)
-    else:
-        logger.error("Invalid movie site")
-        return {"error": "URL must be from IMDb or Letterboxd"}
+        return await fetch_imdb(cleaned_url)
+    if host == "letterboxd.com":
+        return await fetch_letterboxd(cleaned_url)
+    return await fetch_boxd(cleaned_url)
+
+
+async def scrape_and_add_movie(cleaned_url: str, host: str, user_id: int | None) -> dict:
+    """Body of an add-movie job: scrape the movie, insert it and announce it."""
+    movie_data = await scrape_movie(cleaned_url, host)
 
     logger.info(f"Fetched movie data: {movie_data}")
     if not movie_data:
         logger.error("Failed to fetch movie data")
-        return {"error": "Failed to fetch movie data"}
+        raise JobFailed("Failed to fetch movie data")
 
-    if session_token:
-        try:
-            payload = decode_session_jwt(session_token)
-            email = payload.get('email')
-            if email:
-                user_row = get_user_by_mail(email)
-                if user_row and user_row.get('id'):
-                    movie_data['user_id'] = user_row.get('id')
-        except Exception as e:
-            logger.debug(f"Could not attach user to movie: {e}")
+    if user_id is not None:
+        movie_data['user_id'] = user_id
 
     try:
-        _add_movie(movie_data)
+        await _add_movie(movie_data)
     except Exception as e:
         logger.error(f"Error adding movie: {e}")
-        return {"error": "Failed to add movie"}
+        raise JobFailed("Failed to add movie")
 
-    await broadcast_event("movie_added", {"movie_id": movie_data.get("id")})
-    return {"message": "Movie added successfully"}
+    movie = await get_movie(movie_data["id"])
+    await broadcast_movie_change("movie_added", {"movie_id": movie_data["id"], "movie": movie})
+    return {"movie_id": movie_data["id"]}
 
 
-@app.post("/movies/{movie_id}/toggle_watch")
-async def toggle_watch(movie_id: str, session_token: str | None = Cookie(None)):
-    if not session_token:
-        return JSONResponse(status_code=401, content={"error": "Not authenticated"})
+async def report_job(job: Job):
+    # Every client receives this; the one waiting for the job fetches the rest from /jobs/{id}
+    await broadcast_event(f"job_{job.status}", {"job": {"id": job.id, "status": job.status}})
+
+
+add_movie_jobs = JobQueue(
+    "add_movie",
+    workers=ADD_MOVIE_WORKERS,
+    max_queued=ADD_MOVIE_MAX_QUEUED,
+    on_finished=report_job,
+)
+
+
+@app.post("/movies")
+async def add_new_movie(request: AddMovieRequest, user: dict | None = Depends(optional_user)):
+    cleaned_url, host = clean_movie_url(request.movie_url)
+    if host not in VALID_MOVIE_SITES:
+        logger.error("Invalid movie site")
+        return {"error": "URL must be from IMDb or Letterboxd"}
+
+    user_id = user['id'] if user else None
 
     try:
-        payload = decode_session_jwt(session_token)
-        email = payload.get('email')
-        if not email:
-            raise ValueError('Email not in token')
+        job, _created = add_movie_jobs.submit(
+            movie_job_key(cleaned_url, host),
+            lambda: scrape_and_add_movie(cleaned_url, host, user_id),
+        )
+    except asyncio.QueueFull:
+        return JSONResponse(status_code=503, content={"error": "Too many movies being added, try again later"})
+
+    return JSONResponse(status_code=202, content={"job_id": job.id, "status": job.status})
+
+
+class ImportMoviesRequest(BaseModel):
+    urls: list[str]
+
+
+def parse_letterboxd_csv(text: str) -> list[str]:
+    """Film URLs from a Letterboxd CSV export.
+
+    Handles both watchlist/diary exports ("Date,Name,Year,Letterboxd URI") and list
+    exports, which put a few lines of list metadata above a "Position,Name,Year,URL"
+    table.
+    """
+    urls = []
+    url_column = None
+    for row in csv.reader(io.StringIO(text)):
+        if "Year" in row and ("Letterboxd URI" in row or "URL" in row):
+            url_column = row.index("Letterboxd URI" if "Letterboxd URI" in row else "URL")
+            continue
+        if url_column is not None and len(row) > url_column and row[url_column].strip():
+            urls.append(row[url_column].strip())
+    return urls
+
+
+async def import_movies(urls: list[str], user_id: int | None) -> dict:
+    """Body of an import job: scrape every URL, insert the movies in one batch and
+    announce them in one event.
+
+    Each URL gets a result: added, exists (already on the list), failed (could not be
+    scraped) or invalid (not a movie site).
+    """
+    items = [{"url": url} for url in urls]
+    # The same movie may be listed twice or under different URLs; scrape it once
+    targets: dict[str, tuple[str, str, list[dict]]] = {}
+    for item in items:
+        cleaned_url, host = clean_movie_url(item["url"])
+        if host not in VALID_MOVIE_SITES:
+            item.update(status="invalid", error="URL must be from IMDb or Letterboxd")
+            continue
+        targets.setdefault(movie_job_key(cleaned_url, host), (cleaned_url, host, []))[2].append(item)
+
+    semaphore = asyncio.Semaphore(IMPORT_CONCURRENCY)
+
+    async def scrape(cleaned_url: str, host: str) -> dict | None:
+        async with semaphore:
+            return await scrape_movie(cleaned_url, host)
+
+    scraped = await asyncio.gather(*(scrape(cleaned_url, host) for cleaned_url, host, _ in targets.values()))
+
+    movies: dict[str, dict] = {}
+    for (_, _, target_items), movie_data in zip(targets.values(), scraped):
+        if not movie_data:
+            for item in target_items:
+                item.update(status="failed", error="Failed to fetch movie data")
+            continue
+        if user_id is not None:
+            movie_data["user_id"] = user_id
+        movies.setdefault(movie_data["id"], movie_data)
+        for item in target_items:
+            item["movie_id"] = movie_data["id"]
+
+    try:
+        inserted = set(await add_movies(list(movies.values())))
     except Exception as e:
-        logger.error(f"Invalid session token: {e}")
-        return JSONResponse(status_code=401, content={"error": "Invalid session"})
+        logger.error(f"Error importing movies: {e}")
+        raise JobFailed("Failed to add movies")
 
-    user = get_user_by_mail(email)
-    if not user:
-        return JSONResponse(status_code=404, content={"error": "User not found"})
+    for item in items:
+        if "movie_id" in item:
+            item["status"] = "added" if item["movie_id"] in inserted else "exists"
 
-    if not user.get('is_admin'):
-        return JSONResponse(status_code=403, content={"error": "Only admins can toggle watch status"})
+    if inserted:
+        await broadcast_movie_change("movies_added", {"movies": await get_movies_by_ids(list(inserted))})
 
-    movie_row = get_movie_by_id(movie_id)
-    if not movie_row:
-        return JSONResponse(status_code=404, content={"error": "Movie not found"})
+    counts = {status: 0 for status in ("added", "exists", "failed", "invalid")}
+    for item in items:
+        counts[item["status"]] += 1
+    return {**counts, "items": items}
 
-    new_watched = toggle_movie_watched(movie_id)
-    if new_watched is None:
-        return JSONResponse(status_code=500, content={"error": "Failed to toggle watched"})
 
-    await broadcast_event("movie_watched_toggled", {"movie_id": movie_id, "watched": new_watched})
-    return {"message": "Toggled watch status", "watched": new_watched}
+import_jobs = JobQueue("import_movies", workers=1, max_queued=10, on_finished=report_job)
 
 
-@app.post("/movies/{movie_id}/discard")
-async def discard_movie(movie_id: str, session_token: str | None = Cookie(None)):
-    if not session_token:
-        return JSONResponse(status_code=401, content={"error": "Not authenticated"})
+@app.post("/movies/import")
+async def import_movies_endpoint(
+        request: Request,
+        content_type: str | None = Header(None),
+        user: dict | None = Depends(optional_user),
+):
+    """Import many movies at once, from {"urls": [...]} or a Letterboxd CSV export
+    sent as text/csv."""
+    body = await request.body()
+    if content_type and content_type.startswith("text/csv"):
+        urls = parse_letterboxd_csv(body.decode("utf-8-sig", errors="replace"))
+    else:
+        try:
+            urls = ImportMoviesRequest.model_validate_json(body).urls
+        except ValidationError:
+            return JSONResponse(status_code=400, content={"error": "Expected a list of URLs or a Letterboxd CSV export"})
+
+    urls = [url.strip() for url in urls if url.strip()]
+    if not urls:
+        return JSONResponse(status_code=400, content={"error": "No movie URLs to import"})
+    if len(urls) > MAX_IMPORT_ITEMS:
+        return JSONResponse(status_code=400, content={"error": f"Can import at most {MAX_IMPORT_ITEMS} movies at once"})
+
+    user_id = user['id'] if user else None
+    # Re-submitting the same import while it runs joins the running job
+    key = hashlib.blake2b("\n".join(sorted(urls)).encode(), digest_size=16).hexdigest()
 
     try:
-        payload = decode_session_jwt(session_token)
-        email = payload.get('email')
-        if not email:
-            raise ValueError('Email not in token')
-    except Exception as e:
-        logger.error(f"Invalid session token: {e}")
-        return JSONResponse(status_code=401, content={"error": "Invalid session"})
+        job, _created = import_jobs.submit(f"{user_id}:{key}", lambda: import_movies(urls, user_id))
+    except asyncio.QueueFull:
+        return JSONResponse(status_code=503, content={"error": "Too many imports running, try again later"})
 
-    user = get_user_by_mail(email)
-    if not user:
-        return JSONResponse(status_code=404, content={"error": "User not found"})
+    return JSONResponse(status_code=202, content={"job_id": job.id, "status": job.status})
 
-    movie_row = get_movie_by_id(movie_id)
-    if not movie_row:
-        return JSONResponse(status_code=404, content={"error": "Movie not found"})
 
-    if user.get('is_admin'):
-        deleted = delete_movie(movie_id)
-        if not deleted:
-            return JSONResponse(status_code=500, content={"error": "Failed to delete movie"})
-        await broadcast_event("movie_deleted", {"movie_id": movie_id})
-        return {"message": "Movie deleted"}
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = add_movie_jobs.get(job_id) or import_jobs.get(job_id)
+    if job:
+        return job.to_dict()
+    # Run by another worker; it saves its jobs once they start
+    saved = await get_saved_job(job_id)
+    if not saved:
+        return JSONResponse(status_code=404, content={"error": "Job not found"})
+    return saved
 
-    owner_id = movie_row.get('user_id')
-    watched_flag = bool(movie_row.get('watched'))
 
-    if owner_id is None or owner_id != user.get('id'):
-        return JSONResponse(status_code=403, content={"error": "You can only delete your own movies"})
+# Movie operation -> (database action, message when forbidden, message when watched)
+MOVIE_OPERATIONS = {
+    "toggle_watch": ("toggle_watched", "Only admins can toggle watch status", None),
+    "set_watched": ("set_watched", "Only admins can change watch status", None),
+    "toggle_boobies": ("toggle_boobies", "You can only toggle boobies on your own movies",
+                       "Cannot modify watched movies"),
+    "discard": ("delete", "You can only delete your own movies", "Cannot delete watched movies"),
+}
 
-    if watched_flag:
-        return JSONResponse(status_code=403, content={"error": "Cannot delete watched movies"})
+MAX_BATCH_OPERATIONS = int(os.getenv("MAX_BATCH_OPERATIONS", "200"))
 
-    deleted = delete_movie(movie_id)
-    if not deleted:
-        return JSONResponse(status_code=500, content={"error": "Failed to delete movie"})
 
-    await broadcast_event("movie_deleted", {"movie_id": movie_id})
-    return {"message": "Movie deleted"}
+def refusal(operation: str, outcome: MutationOutcome) -> tuple[int, str]:
+    """(status code, message) for a movie operation that was refused."""
+    _action, forbidden, watched = MOVIE_OPERATIONS[operation]
+    if outcome is MutationOutcome.NOT_FOUND:
+        return 404, "Movie not found"
+    if outcome is MutationOutcome.WATCHED and watched:
+        return 403, watched
+    return 403, forbidden
 
 
-@app.post("/movies/{movie_id}/toggle_boobies")
-async def toggle_boobies(movie_id: str, session_token: str | None = Cookie(None)):
-    if not session_token:
-        return JSONResponse(status_code=401, content={"error": "Not authenticated"})
+def mutation_error(operation: str, outcome: MutationOutcome) -> JSONResponse:
+    """Error response for a movie change that was refused."""
+    status_code, message = refusal(operation, outcome)
+    return JSONResponse(status_code=status_code, content={"error": message})
 
-    try:
-        payload = decode_session_jwt(session_token)
-        email = payload.get('email')
-        if not email:
-            raise ValueError('Email not in token')
-    except Exception as e:
-        logger.error(f"Invalid session token: {e}")
-        return JSONResponse(status_code=401, content={"error": "Invalid session"})
 
-    user = get_user_by_mail(email)
-    if not user:
-        return JSONResponse(status_code=404, content={"error": "User not found"})
+@app.post("/movies/{movie_id}/toggle_watch")
+async def toggle_watch(movie_id: str, user: dict = Depends(current_user)):
+    outcome, new_watched = await toggle_movie_watched(movie_id, user['id'])
+    if outcome is not MutationOutcome.OK:
+        return mutation_error("toggle_watch", outcome)
 
-    movie_row = get_movie_by_id(movie_id)
-    if not movie_row:
-        return JSONResponse(status_code=404, content={"error": "Movie not found"})
+    await broadcast_movie_change("movie_watched_toggled", {"movie_id": movie_id, "changes": {"watched": new_watched}})
+    return {"message": "Toggled watch status", "watched": new_watched}
 
-    if user.get('is_admin'):
-        new_val = toggle_movie_boobies(movie_id)
-        if new_val is None:
-            return JSONResponse(status_code=500, content={"error": "Failed to toggle boobies"})
-        await broadcast_event("movie_boobies_toggled", {"movie_id": movie_id, "boobies": new_val})
-        return {"message": "Toggled boobies", "boobies": new_val}
 
-    owner_id = movie_row.get('user_id')
-    watched_flag = bool(movie_row.get('watched'))
+@app.post("/movies/{movie_id}/discard")
+async def discard_movie(movie_id: str, user: dict = Depends(current_user)):
+    outcome = await delete_movie(movie_id, user['id'])
+    if outcome is not MutationOutcome.OK:
+        return mutation_error("discard", outcome)
 
-    if owner_id is None or owner_id != user.get('id'):
-        return JSONResponse(status_code=403, content={"error": "You can only toggle boobies on your own movies"})
+    await broadcast_movie_change("movie_deleted", {"movie_id": movie_id})
+    return {"message": "Movie deleted"}
 
-    if watched_flag:
-        return JSONResponse(status_code=403, content={"error": "Cannot modify watched movies"})
 
-    new_val = toggle_movie_boobies(movie_id)
-    if new_val is None:
-        return JSONResponse(status_code=500, content={"error": "Failed to toggle boobies"})
+@app.post("/movies/{movie_id}/toggle_boobies")
+async def toggle_boobies(movie_id: str, user: dict = Depends(current_user)):
+    outcome, new_val = await toggle_movie_boobies(movie_id, user['id'])
+    if outcome is not MutationOutcome.OK:
+        return mutation_error("toggle_boobies", outcome)
 
-    await broadcast_event("movie_boobies_toggled", {"movie_id": movie_id, "boobies": new_val})
+    await broadcast_movie_change("movie_boobies_toggled", {"movie_id": movie_id, "changes": {"boobies": new_val}})
     return {"message": "Toggled boobies", "boobies": new_val}
 
 
+class MovieOperation(BaseModel):
+    op: Literal["toggle_watch", "set_watched", "toggle_boobies", "discard"]
+    movie_id: str
+    # Only used by set_watched
+    watched: bool | None = None
+
+    @model_validator(mode="after")
+    def check_watched(self):
+        if self.op == "set_watched" and self.watched is None:
+            raise ValueError("set_watched needs a watched value")
+        return self
+
+
+class MovieBatchRequest(BaseModel):
+    operations: list[MovieOperation] = Field(min_length=1, max_length=MAX_BATCH_OPERATIONS)
+
+
+# Column changed by each database action that returns a new value
+ACTION_COLUMNS = {"toggle_watched": "watched", "set_watched": "watched", "toggle_boobies": "boobies"}
+
+
+@app.post("/movies/batch")
+async def batch_movies(body: MovieBatchRequest, user: dict = Depends(current_user)):
+    """Apply several movie operations in one transaction, in the order given.
+
+    Every operation is checked like its single-movie endpoint; a refused one is reported
+    in its result and doesn't stop the others. All changes go out as one movies_updated
+    event, with the final state of each movie.
+    """
+    actions = [
+        (MOVIE_OPERATIONS[item.op][0], item.movie_id, item.watched)
+        for item in body.operations
+    ]
+    outcomes = await run_movie_actions(actions, user['id'])
+
+    results = []
+    changes: dict[str, dict] = {}
+    deleted: list[str] = []
+    for item, (action, movie_id, _value), (outcome, value) in zip(body.operations, actions, outcomes):
+        result = {"op": item.op, "movie_id": movie_id}
+        if outcome is MutationOutcome.OK:
+            result["status"] = "ok"
+            if action == "delete":
+                changes.pop(movie_id, None)
+                deleted.append(movie_id)
+            else:
+                column = ACTION_COLUMNS[action]
+                result[column] = value
+                changes.setdefault(movie_id, {})[column] = value
+        else:
+            status_code, message = refusal(item.op, outcome)
+            result["status"] = "not_found" if status_code == 404 else "forbidden"
+            result["error"] = message
+        results.append(result)
+
+    if changes or deleted:
+        await broadcast_movie_change("movies_updated", {
+            "updates": [{"movie_id": movie_id, "changes": c} for movie_id, c in changes.items()],
+            "deleted": deleted,
+        })
+    return {"results": results}
+
+
 def main():
     uvicorn.run(app, host="127.0.0.1", port=23245)
 
@@ -0,0 +1,204 @@
+"""Prometheus metrics, without a client library.
+
+Recording a value is a dict lookup and a list or dict update, cheap enough for hot
+paths. All the formatting happens in render(), when /metrics is scraped.
+"""
+import functools
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry: list["Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry.append(self)
+
+    def _labels(self, values: tuple, extra: str = '') -> str:
+        pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self._values.items():
+            yield f'{self.name}{self._labels(labels)} {_format_value(value)}'
+
+
+class Gauge(Metric):
+    """A value that goes up and down. With function, it is read from that when scraped."""
+    kind = 'gauge'
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Iterable[str] = (),
+            function: Callable[[], float] | None = None,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+        self._values: dict[tuple, float] = {}
+
+    def set(self, value: float, *labels) -> None:
+        self._values[labels] = value
+
+    def samples(self) -> Iterable[str]:
+        if self.function is not None:
+            yield f'{self.name} {_format_value(self.function())}'
+            return
+        for labels, value in self._values.items():
+            yield f'{self.name}{self._labels(labels)} {_format_value(value)}'
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Iterable[str] = (),
+            buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: count per bucket, then one for +Inf, then the sum.
+        # Counts aren't cumulative until rendered, so observe() touches a single bucket.
+        self._series: dict[tuple, list] = {}
+
+    def _get_series(self, labels: tuple) -> list:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        return series
+
+    def observe(self, value: float, *labels) -> None:
+        series = self._get_series(labels)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def labels(self, *labels) -> "BoundHistogram":
+        """The series for fixed label values, skipping the lookup on every observation."""
+        return BoundHistogram(self.buckets, self._get_series(labels))
+
+    def samples(self) -> Iterable[str]:
+        bounds = [*self.buckets, float('inf')]
+        for labels, series in self._series.items():
+            total = 0
+            for bound, count in zip(bounds, series):
+                total += count
+                le = f'le="{_format_value(bound)}"'
+                yield f'{self.name}_bucket{self._labels(labels, le)} {total}'
+            yield f'{self.name}_sum{self._labels(labels)} {_format_value(series[-1])}'
+            yield f'{self.name}_count{self._labels(labels)} {total}'
+
+
+class BoundHistogram:
+    __slots__ = ('buckets', 'series')
+
+    def __init__(self, buckets: tuple[float, ...], series: list):
+        self.buckets = buckets
+        self.series = series
+
+    def observe(self, value: float) -> None:
+        series = self.series
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+def timed(histogram: Histogram):
+    """Decorator observing how long each call of an async function takes, labelled
+    with the function's name."""
+    def decorate(fn):
+        observe = histogram.labels(fn.__name__).observe
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                observe(time.perf_counter() - start)
+
+        return wrapper
+
+    return decorate
+
+
+class MetricsMiddleware:
+    """Times every HTTP request into histogram, labelled with method, route and status.
+
+    The route is the path template (/movies/{movie_id}/discard), so ids don't create
+    new series. Requests no route matched count as "unmatched"; paths in untimed, such
+    as long-lived streams, aren't timed at all.
+    """
+
+    def __init__(self, app, histogram: Histogram, untimed: Iterable[str] = ()):
+        self.app = app
+        self.histogram = histogram
+        self.untimed = frozenset(untimed)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            if route not in self.untimed:
+                self.histogram.observe(time.perf_counter() - start, scope["method"], route, status)
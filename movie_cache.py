@@ -0,0 +1,124 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass, field
+
+from fast_json import compress, dumps
+
+# Changes made outside the API (scripts, manual SQL) don't invalidate the cache, so
+# responses are rebuilt after this long at the latest
+MOVIES_CACHE_MAX_AGE = float(os.getenv("MOVIES_CACHE_MAX_AGE_SECONDS", "60"))
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    etag: str
+    # Compressed variants of body by content coding, filled in lazily
+    compressed: dict[str, bytes] = field(default_factory=dict)
+    built_at: float = field(default_factory=time.monotonic)
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag derived from the response bytes, so it stays valid across restarts."""
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison, as RFC 9110 requires)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = (tag.strip().removeprefix('W/') for tag in if_none_match.split(','))
+    return etag.removeprefix('W/') in candidates
+
+
+class MoviesCache:
+    """Serialized /movies responses, keyed by query and valid for a single data version.
+
+    Every mutation calls invalidate(), which bumps the version and drops all entries.
+    Entries older than max_age are rebuilt too, which bounds how long changes the API
+    didn't make itself go unseen. Concurrent misses for the same key share one build,
+    so a burst of refetches after a change runs the query once.
+    """
+
+    def __init__(self, max_entries: int = 128, max_age: float = MOVIES_CACHE_MAX_AGE):
+        self.version = 0
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries: OrderedDict[Hashable, CachedResponse] = OrderedDict()
+        self._building: dict[Hashable, asyncio.Future] = {}
+
+    async def compressed(self, cached: CachedResponse, encoding: str) -> bytes:
+        """Return cached.body compressed with encoding, compressing it at most once.
+
+        Compression of a large library takes long enough to matter, so it runs in a
+        worker thread instead of on the event loop.
+        """
+        body = cached.compressed.get(encoding)
+        if body is None:
+            body = await asyncio.to_thread(compress, cached.body, encoding)
+            cached.compressed[encoding] = body
+        return body
+
+    def invalidate(self, version: int | None = None) -> int:
+        """Mark every cached response stale and return the new version.
+
+        version sets the new version when versions are handed out elsewhere (see
+        broadcast.py); one that isn't newer than the current version is ignored.
+        """
+        if version is not None and version <= self.version:
+            return self.version
+        self.version = self.version + 1 if version is None else version
+        self._entries.clear()
+        self._building.clear()
+        return self.version
+
+    async def get(self, key: Hashable, build: Callable[[], Awaitable[dict]]) -> CachedResponse:
+        """Return the cached response for key, building it with build() on a miss."""
+        cached = self._entries.get(key)
+        if cached is not None and time.monotonic() - cached.built_at > self.max_age:
+            del self._entries[key]
+            cached = None
+        if cached is not None:
+            self._entries.move_to_end(key)
+            return cached
+
+        pending = self._building.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        version = self.version
+        future = asyncio.get_running_loop().create_future()
+        self._building[key] = future
+        try:
+            # The version lets clients tell which SSE events the payload already includes
+            payload = {**await build(), 'version': version}
+            body = dumps(payload)
+            cached = CachedResponse(body=body, etag=make_etag(body))
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting on it
+            future.exception()
+            raise
+        finally:
+            if self._building.get(key) is future:
+                del self._building[key]
+
+        future.set_result(cached)
+        # A mutation that landed while the query ran makes this result stale
+        if version == self.version:
+            self._entries[key] = cached
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return cached
+
+
+movies_cache = MoviesCache()
@@ -1,62 +1,378 @@
+import asyncio
+import html
+import os
 import re
-from urllib.parse import quote_plus
+import time
+from urllib.parse import quote_plus, urlparse
 
-import requests
+import httpx
+import orjson
 from bs4 import BeautifulSoup
 
+from metrics import Counter, Histogram
+from scrape_cache import scrape_cache
+
+# Overridable so the scraper can be pointed at a local stub server
+IMDB_BASE_URL = os.getenv("IMDB_BASE_URL", "https://www.imdb.com")
+LETTERBOXD_BASE_URL = os.getenv("LETTERBOXD_BASE_URL", "https://letterboxd.com")
+
+SCRAPE_TIMEOUT = httpx.Timeout(connect=5.0, read=10.0, write=5.0, pool=5.0)
+SCRAPE_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30.0)
+# The Letterboxd cross-link is optional, don't let it hold up an add for long
+LETTERBOXD_LOOKUP_TIMEOUT = 5.0
+
+# Requests per minute allowed to each host, and how many may go out back to back
+SCRAPE_RATE_LIMIT_PER_MINUTE = float(os.getenv("SCRAPE_RATE_LIMIT_PER_MINUTE", "120"))
+SCRAPE_RATE_LIMIT_BURST = int(os.getenv("SCRAPE_RATE_LIMIT_BURST", "10"))
+
+# C-backed parser for the pages where the structured data isn't enough
+HTML_PARSER = 'lxml'
+
+JSON_LD_RE = re.compile(r'<script[^>]*type="application/ld\+json"[^>]*>(.*?)</script>', re.S)
+NEXT_DATA_RE = re.compile(r'<script[^>]*id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.S)
+
 FETCH_HEADER = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3',
     'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
     "Accept-Language": "en-US,en;q=0.9"
 }
 
-def fetch_imdb(url: str) -> dict | None:
+_client: httpx.AsyncClient | None = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared scraper client, creating it on first use.
+
+    One long-lived client keeps connections (HTTP/2 where the site offers it) alive
+    across scrapes, and every request gets explicit connect/read timeouts.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            headers=FETCH_HEADER,
+            http2=True,
+            timeout=SCRAPE_TIMEOUT,
+            limits=SCRAPE_LIMITS,
+            follow_redirects=True,
+        )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+class HostRateLimiter:
+    """Token bucket per host, so bulk scrapes don't hammer IMDb or Letterboxd.
+
+    Callers reserve a token up front and sleep off any debt, which keeps concurrent
+    waiters spaced evenly instead of waking all at once.
+    """
+
+    def __init__(self, per_minute: float, burst: int):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self._buckets: dict[str, tuple[float, float]] = {}
+
+    async def wait(self, host: str) -> None:
+        now = asyncio.get_running_loop().time()
+        tokens, updated = self._buckets.get(host, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate) - 1
+        self._buckets[host] = (tokens, now)
+        if tokens < 0:
+            await asyncio.sleep(-tokens / self.rate)
+
+
+rate_limiter = HostRateLimiter(SCRAPE_RATE_LIMIT_PER_MINUTE, SCRAPE_RATE_LIMIT_BURST)
+
+SCRAPE_SECONDS = Histogram(
+    "movienite_scrape_request_seconds",
+    "Time of scraper requests by host, not counting the wait for the rate limit",
+    ["host"],
+)
+SCRAPE_FAILURES = Counter(
+    "movienite_scrape_failures_total",
+    "Scraper requests that failed, by host and reason (exception or http_<status>)",
+    ["host", "reason"],
+)
+
+
+async def fetch(url: str, headers: dict | None = None) -> httpx.Response:
+    """GET url on the shared client, within the rate limit of its host."""
+    host = urlparse(url).hostname or ''
+    await rate_limiter.wait(host)
+    start = time.perf_counter()
     try:
-        response = requests.get(url, headers=FETCH_HEADER)
-        response.raise_for_status()
+        response = await get_client().get(url, headers=headers)
+    except httpx.HTTPError as e:
+        SCRAPE_FAILURES.inc(host, type(e).__name__)
+        raise
+    finally:
+        SCRAPE_SECONDS.observe(time.perf_counter() - start, host)
+    if response.status_code >= 400:
+        SCRAPE_FAILURES.inc(host, f"http_{response.status_code}")
+    return response
+
+
+def format_votes(count: int) -> str:
+    """Format a vote count the way IMDb displays it (87, 2.6K, 345K, 1.2M)."""
+    # Compare after rounding, so 999,500 becomes 1M rather than 1000K
+    if round(count / 1_000) >= 1_000:
+        return f'{count / 1_000_000:.1f}'.removesuffix('.0') + 'M'
+    if count >= 10_000:
+        return f'{count / 1_000:.0f}K'
+    if count >= 1_000:
+        return f'{count / 1_000:.1f}'.removesuffix('.0') + 'K'
+    return str(count)
+
+
+def _parse_imdb_json_ld(page: str) -> dict | None:
+    """Read the schema.org block IMDb embeds in the page head."""
+    match = JSON_LD_RE.search(page)
+    if not match:
+        return None
+    try:
+        data = orjson.loads(match.group(1))
+    except orjson.JSONDecodeError:
+        return None
+    if not isinstance(data, dict) or not data.get('name'):
+        return None
+
+    title = html.unescape(data['name']).strip()
+    alternate_name = html.unescape(data.get('alternateName') or '').strip()
+    rating = data.get('aggregateRating') or {}
+    rating_value = rating.get('ratingValue')
+    rating_count = rating.get('ratingCount')
+    image = data.get('image')
+
+    return {
+        'title': title,
+        'original_title': alternate_name if alternate_name != title else '',
+        'description': html.unescape(data.get('description') or '').strip(),
+        'image_link': image if isinstance(image, str) else '',
+        'rating': str(rating_value) if rating_value is not None else '',
+        'votes': format_votes(rating_count) if isinstance(rating_count, int) else '',
+    }
+
+
+def _parse_imdb_next_data(page: str) -> dict | None:
+    """Read the Next.js page state, which carries the same fields as the rendered page."""
+    match = NEXT_DATA_RE.search(page)
+    if not match:
+        return None
+    try:
+        fold = orjson.loads(match.group(1))['props']['pageProps']['aboveTheFoldData']
+    except (orjson.JSONDecodeError, KeyError, TypeError):
+        return None
+
+    title = ((fold.get('titleText') or {}).get('text') or '').strip()
+    if not title:
+        return None
+    original_title = ((fold.get('originalTitleText') or {}).get('text') or '').strip()
+    plot = ((fold.get('plot') or {}).get('plotText') or {}).get('plainText') or ''
+    ratings = fold.get('ratingsSummary') or {}
+    rating_value = ratings.get('aggregateRating')
+    vote_count = ratings.get('voteCount')
+
+    return {
+        'title': title,
+        'original_title': original_title if original_title != title else '',
+        'description': plot.strip(),
+        'image_link': (fold.get('primaryImage') or {}).get('url') or '',
+        'rating': str(rating_value) if rating_value is not None else '',
+        'votes': format_votes(vote_count) if isinstance(vote_count, int) else '',
+    }
+
+
+def _parse_imdb_html(page: str, parser: str = HTML_PARSER) -> dict:
+    """Scrape the rendered markup. Slowest path, only used when the structured data is missing."""
+    soup = BeautifulSoup(page, parser)
+    title = soup.find('span', class_='hero__primary-text')
+    original_title = title.parent.parent.find('div')
+    if original_title is not None:
+        original_title = title.parent.parent.find('div').text[16:]
+    else:
+        original_title = ""
+    title = title.text.strip()
+    description = soup.select_one("p[data-testid='plot'] > span[role='presentation']").text.strip()
+    image_link = soup.find('img', class_='ipc-image')['src']
+    rating = soup.find_all('span', class_='ipc-btn__text')
+    rating = rating[8].text.strip()
+    score = rating.split('/')[0]
+    votes = rating.split('/')[1][2:]
+
+    return {
+        'title': title,
+        'original_title': original_title,
+        'description': description,
+        'image_link': image_link,
+        'rating': score,
+        'votes': votes,
+    }
+
+
+def parse_imdb_page(page: str) -> dict | None:
+    """Extract title, original_title, description, image_link, rating and votes.
+
+    The embedded JSON-LD is tried first, then __NEXT_DATA__, and only then is the
+    whole document parsed. Returns None when none of them yields a title.
+    """
+    for extract in (_parse_imdb_json_ld, _parse_imdb_next_data):
+        data = extract(page)
+        if data:
+            return data
+    try:
+        return _parse_imdb_html(page)
+    except (AttributeError, IndexError, KeyError, TypeError):
+        return None
+
+
+# IMDb scrapes in progress by title id
+_imdb_scrapes: dict[str, asyncio.Task] = {}
+
+
+async def fetch_imdb(url: str, letterboxd_url: str | None = None, *, use_cache: bool = True) -> dict | None:
+    """Scrape an IMDb title page.
+
+    Unless letterboxd_url is already known, the Letterboxd cross-lookup runs at the
+    same time as the IMDb request. It may fail or time out without failing the scrape,
+    in which case letterboxd_url is left empty and the result is only cached for the
+    scrape cache's negative TTL. With use_cache=False the page is always
+    fetched, and the result still refreshes the cache.
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        title = soup.find('span', class_='hero__primary-text')
-        original_title = title.parent.parent.find('div')
-        if original_title is not None:
-            original_title = title.parent.parent.find('div').text[16:]
-        else:
-            original_title = ""
-        title = title.text.strip()
-        description = soup.select_one("p[data-testid='plot'] > span[role='presentation']").text.strip()
+    Concurrent calls for the same title share one scrape, whether they came from an
+    IMDb, Letterboxd or boxd.it URL; each gets its own copy of the result.
+    """
+    try:
         id = url.split('/')[4]
-        imdb_url = f'https://www.imdb.com/title/{id}/'
-        image_link = soup.find('img', class_='ipc-image')['src']
-        rating = soup.find_all('span', class_='ipc-btn__text')
-        rating = rating[8].text.strip()
-        score = rating.split('/')[0]
-        votes = rating.split('/')[1][2:]
-        letterboxd_url = fetch_letterboxd_url_by_imdb_id(id)
+    except IndexError:
+        return None
 
-        return {
+    scrape = _imdb_scrapes.get(id)
+    if scrape is None:
+        scrape = asyncio.create_task(_scrape_imdb(id, letterboxd_url, use_cache))
+        _imdb_scrapes[id] = scrape
+        scrape.add_done_callback(lambda task: _imdb_scrapes.pop(id) if _imdb_scrapes.get(id) is task else None)
+    movie_data = await asyncio.shield(scrape)
+    if movie_data is None:
+        return None
+    if letterboxd_url is None:
+        return dict(movie_data)
+    return {**movie_data, 'letterboxd_url': letterboxd_url}
+
+
+async def _scrape_imdb(id: str, letterboxd_url: str | None, use_cache: bool) -> dict | None:
+    cache_key = f'imdb:{id}'
+    found, cached = await scrape_cache.get(cache_key) if use_cache else (False, None)
+    if found:
+        return cached
+
+    lookup = None
+    if letterboxd_url is None:
+        lookup = asyncio.create_task(fetch_letterboxd_url_by_imdb_id(id))
+
+    try:
+        response = await fetch(f'{IMDB_BASE_URL}/title/{id}/')
+        if response.status_code in (404, 410):
+            await scrape_cache.put(cache_key, None)
+            return None
+        response.raise_for_status()
+
+        page_data = parse_imdb_page(response.text)
+        if not page_data:
+            await scrape_cache.put(cache_key, None)
+            return None
+
+        lookup_failed = False
+        if lookup is not None:
+            letterboxd_url = await _letterboxd_lookup_result(lookup)
+            lookup_failed = letterboxd_url is None
+
+        movie_data = {
             'id': id,
-            'title': title,
-            'original_title': original_title,
-            'description': description,
-            'letterboxd_url': letterboxd_url,
-            'imdb_url': imdb_url,
-            'image_link': image_link,
-            'rating': score,
-            'votes': votes,
+            **page_data,
+            'letterboxd_url': letterboxd_url or '',
+            'imdb_url': f'https://www.imdb.com/title/{id}/',
             'boobies': False,
             'watched': False
         }
-    except:
+        # Keep a result missing its Letterboxd link only briefly, so the lookup is retried
+        await scrape_cache.put(cache_key, movie_data, ttl=scrape_cache.negative_ttl if lookup_failed else None)
+        return movie_data
+    except Exception:
         return None
+    finally:
+        if lookup is not None and not lookup.done():
+            lookup.cancel()
 
-def fetch_letterboxd_url_by_imdb_id(imdb_id: str) -> str | None:
-    url = f"https://letterboxd.com/imdb/{imdb_id}/"
-    response = requests.get(url, headers=FETCH_HEADER, allow_redirects=True)
+
+async def fetch_imdb_rating(id: str, etag: str | None = None, last_modified: str | None = None) -> dict | None:
+    """Re-check the rating and vote count of an IMDb title.
+
+    Sends a conditional request when validators from the previous check are given.
+    Returns {'modified', 'rating', 'votes', 'etag', 'last_modified'}, where rating and
+    votes are None if IMDb answered 304 Not Modified, or None if the check failed.
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    try:
+        response = await fetch(f'{IMDB_BASE_URL}/title/{id}/', headers=headers)
+    except httpx.HTTPError:
+        return None
+
+    if response.status_code == 304:
+        return {
+            'modified': False,
+            'rating': None,
+            'votes': None,
+            'etag': response.headers.get('ETag', etag),
+            'last_modified': response.headers.get('Last-Modified', last_modified),
+        }
+    if response.status_code != 200:
+        return None
+
+    page_data = parse_imdb_page(response.text)
+    if not page_data:
+        return None
+    return {
+        'modified': True,
+        'rating': page_data['rating'] or None,
+        'votes': page_data['votes'] or None,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+    }
+
+
+async def _letterboxd_lookup_result(lookup: asyncio.Task) -> str | None:
+    try:
+        return await asyncio.wait_for(lookup, LETTERBOXD_LOOKUP_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+
+
+async def fetch_letterboxd_url_by_imdb_id(imdb_id: str) -> str | None:
+    """The Letterboxd URL of an IMDb title, "" if Letterboxd has no film for it, or None
+    if the lookup failed."""
+    url = f"{LETTERBOXD_BASE_URL}/imdb/{imdb_id}/"
+    try:
+        response = await fetch(url)
+    except httpx.HTTPError:
+        return None
     if response.status_code == 200:
-        return response.url
-    return ""
+        return str(response.url)
+    if response.status_code == 404:
+        return ""
+    return None
+
 
-def fetch_letterboxd(url: str) -> dict | None:
+async def fetch_letterboxd(url: str) -> dict | None:
     """Resolve a Letterboxd URL to an IMDb title by searching IMDb.
 
     Letterboxd often blocks server-side scraping (403/Cloudflare). Instead of
@@ -75,29 +391,39 @@ def fetch_letterboxd(url: str) -> dict | None:
         if not movie_title:
             return None
 
-        search_url = f"https://www.imdb.com/find/?q={quote_plus(movie_title)}"
-        response = requests.get(search_url, headers=FETCH_HEADER, timeout=10)
+        cache_key = f'letterboxd:{slug}'
+        found, cached = await scrape_cache.get(cache_key)
+        if found:
+            return {**cached, 'letterboxd_url': url} if cached is not None else None
+
+        search_url = f"{IMDB_BASE_URL}/find/?q={quote_plus(movie_title)}"
+        response = await fetch(search_url)
         response.raise_for_status()
 
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = BeautifulSoup(response.text, HTML_PARSER)
         first_link = soup.find('a', class_='ipc-title-link-wrapper')
         if not first_link or not first_link.get('href'):
+            await scrape_cache.put(cache_key, None)
             return None
 
         href = first_link['href']
         imdb_url = f"https://www.imdb.com{href}" if href.startswith('/') else href
 
-        movie_data = fetch_imdb(imdb_url)
+        # The Letterboxd URL is already known, skip the cross-lookup
+        movie_data = await fetch_imdb(imdb_url, letterboxd_url=url)
         if not movie_data:
             return None
 
-        movie_data['letterboxd_url'] = url
+        await scrape_cache.put(cache_key, movie_data)
         return movie_data
     except Exception:
         return None
 
 
-def fetch_boxd(url: str) -> dict | None:
-    response = requests.get(url, allow_redirects=True, timeout=10)
-    final_url = response.url
-    return fetch_letterboxd(final_url)
+async def fetch_boxd(url: str) -> dict | None:
+    try:
+        response = await fetch(url)
+    except httpx.HTTPError:
+        return None
+    final_url = str(response.url)
+    return await fetch_letterboxd(final_url)
@@ -0,0 +1,167 @@
+import asyncio
+import datetime
+import logging
+import os
+from collections.abc import Awaitable, Callable
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from urllib.parse import urlparse
+
+from broadcast import announce_movie_change
+from database.db import claim_stale_movie_ratings, close_pool, open_pool, update_movie_ratings
+from movienite import IMDB_BASE_URL, HostRateLimiter, close_client, fetch_imdb_rating
+
+logger = logging.getLogger("uvicorn.error")
+
+RATING_REFRESH_ENABLED = os.getenv("RATING_REFRESH_ENABLED", "1") == "1"
+RATING_REFRESH_MAX_AGE = datetime.timedelta(hours=float(os.getenv("RATING_REFRESH_MAX_AGE_HOURS", "24")))
+# Pause between sweeps once every movie is fresh
+RATING_REFRESH_INTERVAL = float(os.getenv("RATING_REFRESH_INTERVAL_SECONDS", "300"))
+RATING_REFRESH_BATCH_SIZE = int(os.getenv("RATING_REFRESH_BATCH_SIZE", "50"))
+RATING_REFRESH_CONCURRENCY = int(os.getenv("RATING_REFRESH_CONCURRENCY", "4"))
+# The refresher's share of IMDb's request budget, on top of the scraper-wide limit, so
+# it can't crowd out movies being added by users
+RATING_REFRESH_PER_MINUTE = float(os.getenv("RATING_REFRESH_PER_MINUTE", "30"))
+
+
+def format_rating(value) -> str:
+    """Rating the way /movies returns it (the column is NUMERIC(3,1))."""
+    try:
+        return str(Decimal(str(value)).quantize(Decimal('0.1')))
+    except InvalidOperation:
+        return ''
+
+
+def storable_rating(value) -> Decimal | None:
+    """value rounded to one decimal, or None if it isn't a rating.
+
+    Like csv_migrator.validate_row, anything outside 0-10 is rejected rather than
+    clamped; it means the page was misread.
+    """
+    try:
+        rating = Decimal(str(value)).quantize(Decimal('0.1'), ROUND_HALF_UP)
+    except InvalidOperation:
+        return None
+    return rating if 0 <= rating <= 10 else None
+
+
+class RatingRefresher:
+    """Keeps rating and votes current by re-checking the stalest movies in batches.
+
+    Unwatched movies go first, then the ones refreshed longest ago. Each batch is
+    claimed in the database first, so refreshers in several workers share the work
+    instead of all checking the same movies. IMDb is asked with conditional requests
+    where it handed out an ETag or Last-Modified before. Movies whose numbers changed
+    are passed to on_refreshed as {'movie_id', 'changes'} dicts.
+    """
+
+    def __init__(
+            self,
+            on_refreshed: Callable[[list[dict]], Awaitable[None]] | None = None,
+            *,
+            max_age: datetime.timedelta = RATING_REFRESH_MAX_AGE,
+            interval: float = RATING_REFRESH_INTERVAL,
+            batch_size: int = RATING_REFRESH_BATCH_SIZE,
+            concurrency: int = RATING_REFRESH_CONCURRENCY,
+            per_minute: float = RATING_REFRESH_PER_MINUTE,
+    ):
+        self.on_refreshed = on_refreshed
+        self.max_age = max_age
+        self.interval = interval
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.limiter = HostRateLimiter(per_minute, burst=1)
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def refresh_batch(self) -> int:
+        """Refresh one batch of stale movies. Returns how many were checked."""
+        movies = await claim_stale_movie_ratings(self.max_age, self.batch_size)
+        host = urlparse(IMDB_BASE_URL).hostname or ''
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def check(movie: dict) -> dict | None:
+            async with semaphore:
+                await self.limiter.wait(host)
+                return await fetch_imdb_rating(movie['id'], movie['imdb_etag'], movie['imdb_last_modified'])
+
+        results = await asyncio.gather(*(check(movie) for movie in movies))
+
+        updates = []
+        changed = []
+        for movie, result in zip(movies, results):
+            if result is None:
+                # Failed checks count as refreshed too, so one broken title can't keep
+                # the head of the queue; it is retried once it is stale again
+                logger.warning(f"Could not refresh rating of {movie['id']}")
+                result = {'rating': None, 'votes': None,
+                          'etag': movie['imdb_etag'], 'last_modified': movie['imdb_last_modified']}
+
+            rating = storable_rating(result['rating']) if result['rating'] is not None else None
+            if result['rating'] is not None and rating is None:
+                # Keep the stored rating; the rest of the batch must still be written
+                logger.warning(f"Ignoring out of range rating {result['rating']!r} of {movie['id']}")
+
+            updates.append({
+                'id': movie['id'],
+                'rating': rating,
+                'votes': result['votes'],
+                'imdb_etag': result['etag'],
+                'imdb_last_modified': result['last_modified'],
+            })
+
+            changes = {}
+            if rating is not None and format_rating(rating) != format_rating(movie['rating']):
+                changes['rating'] = format_rating(rating)
+            if result['votes'] is not None and result['votes'] != movie['votes']:
+                changes['votes'] = result['votes']
+            if changes:
+                changed.append({'movie_id': movie['id'], 'changes': changes})
+
+        await update_movie_ratings(updates)
+        if changed and self.on_refreshed is not None:
+            await self.on_refreshed(changed)
+        return len(movies)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                checked = await self.refresh_batch()
+            except Exception as e:
+                logger.error(f"Rating refresh failed: {e}")
+                checked = 0
+            # Work through a backlog without pausing; the rate limit paces it
+            if checked < self.batch_size:
+                await asyncio.sleep(self.interval)
+
+
+async def announce_refreshed_ratings(updates: list[dict]) -> None:
+    await announce_movie_change("movies_updated", {"updates": updates})
+
+
+async def refresh_stale_ratings() -> None:
+    """Refresh every stale movie once, for running outside the app."""
+    await open_pool()
+    try:
+        refresher = RatingRefresher(on_refreshed=announce_refreshed_ratings)
+        total = 0
+        while checked := await refresher.refresh_batch():
+            total += checked
+            logger.info(f"Checked {total} movies")
+            if checked < refresher.batch_size:
+                break
+    finally:
+        await close_client()
+        await close_pool()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(refresh_stale_ratings())
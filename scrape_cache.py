@@ -0,0 +1,91 @@
+import datetime
+import logging
+import os
+from dataclasses import dataclass
+
+from database.db import evict_scrape_cache_entries, get_scrape_cache_entry, put_scrape_cache_entry
+
+logger = logging.getLogger("uvicorn.error")
+
+SCRAPE_CACHE_TTL = datetime.timedelta(hours=float(os.getenv("SCRAPE_CACHE_TTL_HOURS", "168")))
+SCRAPE_CACHE_NEGATIVE_TTL = datetime.timedelta(hours=float(os.getenv("SCRAPE_CACHE_NEGATIVE_TTL_HOURS", "1")))
+SCRAPE_CACHE_MAX_ENTRIES = int(os.getenv("SCRAPE_CACHE_MAX_ENTRIES", "10000"))
+# Writes between two sweeps of expired and surplus entries
+SCRAPE_CACHE_SWEEP_INTERVAL = int(os.getenv("SCRAPE_CACHE_SWEEP_INTERVAL", "100"))
+
+
+@dataclass
+class ScrapeCacheStats:
+    hits: int = 0
+    negative_hits: int = 0
+    misses: int = 0
+    errors: int = 0
+
+
+class ScrapeCache:
+    """Postgres-backed cache of scrape results in front of movienite.
+
+    Entries expire after ttl. Negative entries (None) mark titles that don't exist or
+    had no usable data; they expire after the shorter negative_ttl. Every
+    sweep_interval writes, expired entries are deleted and the table is trimmed back
+    to max_entries, so it may briefly hold a few more. Cache failures are logged and
+    treated as misses, so scraping still works when the database is unavailable.
+    """
+
+    def __init__(
+            self,
+            ttl: datetime.timedelta = SCRAPE_CACHE_TTL,
+            negative_ttl: datetime.timedelta = SCRAPE_CACHE_NEGATIVE_TTL,
+            max_entries: int = SCRAPE_CACHE_MAX_ENTRIES,
+            sweep_interval: int = SCRAPE_CACHE_SWEEP_INTERVAL,
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self.stats = ScrapeCacheStats()
+        self._writes = 0
+
+    async def get(self, key: str) -> tuple[bool, dict | None]:
+        """Return (found, value). value is None for a negative entry."""
+        try:
+            found, value = await get_scrape_cache_entry(key)
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"Scrape cache lookup failed for {key}: {e}")
+            return False, None
+
+        if not found:
+            self.stats.misses += 1
+        elif value is None:
+            self.stats.negative_hits += 1
+        else:
+            self.stats.hits += 1
+        return found, value
+
+    async def put(self, key: str, value: dict | None, ttl: datetime.timedelta | None = None) -> None:
+        """Store a result, or a negative entry when value is None. ttl overrides how long
+        the entry lives."""
+        if ttl is None:
+            ttl = self.ttl if value is not None else self.negative_ttl
+        try:
+            await put_scrape_cache_entry(key, value, ttl)
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"Scrape cache write failed for {key}: {e}")
+            return
+
+        self._writes += 1
+        if self._writes % self.sweep_interval == 0:
+            await self.sweep()
+
+    async def sweep(self) -> None:
+        """Delete expired entries and trim the table to max_entries."""
+        try:
+            await evict_scrape_cache_entries(self.max_entries)
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"Scrape cache sweep failed: {e}")
+
+
+scrape_cache = ScrapeCache()
@@ -0,0 +1,99 @@
+from collections.abc import Callable
+
+import httpx
+import psycopg
+import pytest
+from psycopg_pool import AsyncConnectionPool
+
+import auth
+import discord_oauth
+import movienite
+import scrape_cache
+from database import db
+from tests.fake_discord import FakeDiscord
+
+
+@pytest.fixture
+def scrape_cache_entries(monkeypatch) -> dict:
+    """Keep the scrape cache in a dict of key -> (value, ttl) instead of Postgres."""
+    entries = {}
+
+    async def get_entry(key):
+        if key not in entries:
+            return False, None
+        return True, entries[key][0]
+
+    async def put_entry(key, value, ttl):
+        entries[key] = (value, ttl)
+
+    async def evict_entries(max_entries):
+        expiring = sorted(entries, key=lambda key: entries[key][1], reverse=True)
+        for key in expiring[max_entries:]:
+            del entries[key]
+        return max(0, len(expiring) - max_entries)
+
+    monkeypatch.setattr(scrape_cache, 'get_scrape_cache_entry', get_entry)
+    monkeypatch.setattr(scrape_cache, 'put_scrape_cache_entry', put_entry)
+    monkeypatch.setattr(scrape_cache, 'evict_scrape_cache_entries', evict_entries)
+    return entries
+
+
+@pytest.fixture
+def scraper_transport(scrape_cache_entries, monkeypatch):
+    """Route the scraper's requests to a handler instead of the network, with a fresh
+    rate limit so earlier tests don't slow it down.
+
+    Call it with a function taking an httpx.Request and returning an httpx.Response
+    (or raising an httpx error); it returns the list the requests are recorded in.
+    """
+    monkeypatch.setattr(movienite, 'rate_limiter', movienite.HostRateLimiter(
+        movienite.SCRAPE_RATE_LIMIT_PER_MINUTE, movienite.SCRAPE_RATE_LIMIT_BURST))
+
+    def install(handler: Callable[[httpx.Request], httpx.Response]) -> list[httpx.Request]:
+        requests = []
+
+        def record(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return handler(request)
+
+        movienite._client = httpx.AsyncClient(
+            headers=movienite.FETCH_HEADER,
+            timeout=movienite.SCRAPE_TIMEOUT,
+            follow_redirects=True,
+            transport=httpx.MockTransport(record),
+        )
+        return requests
+
+    yield install
+    movienite._client = None
+
+
+@pytest.fixture
+def fake_discord(monkeypatch):
+    """Point the Discord OAuth client at a FakeDiscord served on localhost, with a
+    known JWT secret and no renewals left over from earlier tests."""
+    discord = FakeDiscord()
+    monkeypatch.setattr(discord_oauth, 'DISCORD_API_BASE_URL', discord.start())
+    monkeypatch.setattr(discord_oauth, '_client', None)
+    monkeypatch.setattr(auth, 'JWT_SECRET', 'a-test-secret-of-at-least-32-bytes')
+    monkeypatch.setattr(auth, '_renewals', {})
+    yield discord
+    discord.stop()
+
+
+@pytest.fixture
+def database(monkeypatch):
+    """A fresh, unopened connection pool for the database configured by POSTGRES_*;
+    the test is skipped when that database can't be reached or isn't migrated.
+
+    Open and close it with db.open_pool()/close_pool() inside the test's event loop.
+    """
+    try:
+        with psycopg.connect(db.DB_URL, connect_timeout=2) as conn:
+            conn.execute('SELECT 1 FROM alembic_version')
+    except psycopg.Error as e:
+        pytest.skip(f"No migrated database: {e}")
+
+    pool = AsyncConnectionPool(db.DB_URL, min_size=1, max_size=4, open=False)
+    monkeypatch.setattr(db, 'pool', pool)
+    return pool
@@ -0,0 +1,76 @@
+"""A fake Discord OAuth API, served on localhost for the session renewal tests."""
+import asyncio
+import itertools
+import threading
+import time
+from urllib.parse import parse_qsl
+
+import uvicorn
+from fastapi import FastAPI, Header, Request
+from fastapi.responses import JSONResponse
+
+
+class FakeDiscord:
+    """Issues tokens for the users it knows and rotates refresh tokens like Discord,
+    so each one is accepted only once. token_requests records every grant asked for."""
+
+    def __init__(self, token_delay: float = 0.1):
+        self.token_delay = token_delay
+        self.refresh_tokens: dict[str, str] = {}
+        self.access_tokens: dict[str, str] = {}
+        self.token_requests: list[dict] = []
+        self._counter = itertools.count()
+        self.app = self._build_app()
+        self._server: uvicorn.Server | None = None
+        self._thread: threading.Thread | None = None
+
+    def add_session(self, email: str) -> str:
+        """Return a refresh token Discord will accept once for email."""
+        refresh_token = f"refresh-{next(self._counter)}"
+        self.refresh_tokens[refresh_token] = email
+        return refresh_token
+
+    def _issue(self, email: str) -> dict:
+        n = next(self._counter)
+        access_token, refresh_token = f"access-{n}", f"refresh-{n}"
+        self.access_tokens[access_token] = email
+        self.refresh_tokens[refresh_token] = email
+        return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "Bearer"}
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/oauth2/token")
+        async def token(request: Request):
+            form = dict(parse_qsl((await request.body()).decode()))
+            grant_type, refresh_token = form.get("grant_type"), form.get("refresh_token")
+            self.token_requests.append({"grant_type": grant_type, "refresh_token": refresh_token})
+            # Slow enough for requests sent together to overlap
+            await asyncio.sleep(self.token_delay)
+            email = self.refresh_tokens.pop(refresh_token, None)
+            if grant_type != "refresh_token" or email is None:
+                return JSONResponse(status_code=400, content={"error": "invalid_grant"})
+            return self._issue(email)
+
+        @app.get("/users/@me")
+        async def me(authorization: str = Header()):
+            email = self.access_tokens.get(authorization.removeprefix("Bearer "))
+            if email is None:
+                return JSONResponse(status_code=401, content={"message": "401: Unauthorized"})
+            return {"id": "42", "username": email.split("@")[0], "avatar": None, "email": email}
+
+        return app
+
+    def start(self) -> str:
+        """Serve on a free local port in a background thread; returns the base URL."""
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=0, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        port = self._server.servers[0].sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join()
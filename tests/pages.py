@@ -0,0 +1,27 @@
+"""Minimal IMDb and Letterboxd pages with just the markup the scraper reads."""
+
+
+def imdb_html_page(title: str = "Heat", original_title: str | None = None, rating: str = "8.3",
+                   votes: str = "740K") -> str:
+    original = f'<div>Original title: {original_title}</div>' if original_title else ''
+    # The rating is the ninth ipc-btn__text span, as "8.3/10" followed by the vote count
+    buttons = ''.join(f'<span class="ipc-btn__text">Button {i}</span>' for i in range(8))
+    return f"""<html><body>
+<div><h1><span class="hero__primary-text">{title}</span></h1>{original}</div>
+<p data-testid="plot"><span role="presentation">A group of professional bank robbers.</span></p>
+<img class="ipc-image" src="https://m.media-amazon.com/images/heat.jpg"/>
+{buttons}<span class="ipc-btn__text">{rating}/10{votes}</span>
+</body></html>"""
+
+
+def imdb_find_page(href: str | None) -> str:
+    link = f'<a class="ipc-title-link-wrapper" href="{href}">Result</a>' if href else ''
+    return f'<html><body>{link}</body></html>'
+
+
+def imdb_json_ld_page(json_ld: str) -> str:
+    return f'<html><head><script type="application/ld+json">{json_ld}</script></head><body></body></html>'
+
+
+def imdb_next_data_page(next_data: str) -> str:
+    return f'<html><body><script id="__NEXT_DATA__" type="application/json">{next_data}</script></body></html>'
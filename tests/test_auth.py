@@ -0,0 +1,89 @@
+import asyncio
+import datetime
+
+import httpx
+import jwt
+import pytest
+
+import auth
+import discord_oauth
+import main
+
+USER = {'id': 1, 'username': 'neil', 'email': 'neil@example.com', 'is_admin': False}
+
+
+@pytest.fixture(autouse=True)
+def known_user(monkeypatch):
+    async def get(email):
+        return USER if email == USER['email'] else None
+
+    monkeypatch.setattr(auth.user_cache, 'get', get)
+
+
+def expired_session(refresh_token: str) -> str:
+    return jwt.encode({
+        'sub': 'discord_session',
+        'email': USER['email'],
+        'discord_access_token': 'expired',
+        'discord_refresh_token': refresh_token,
+        'exp': datetime.datetime.now(datetime.UTC) - datetime.timedelta(minutes=1),
+    }, auth.JWT_SECRET, algorithm=auth.JWT_ALGORITHM)
+
+
+def send(session_token: str, method: str, path: str, times: int = 1, **kwargs) -> list[httpx.Response]:
+    """Send the same request concurrently through the app, with session_token as cookie."""
+    async def send_all():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://testserver',
+                                     cookies={'session_token': session_token}) as client:
+            try:
+                return await asyncio.gather(*(client.request(method, path, **kwargs) for _ in range(times)))
+            finally:
+                await discord_oauth.close_client()
+
+    return asyncio.run(send_all())
+
+
+def renewed_session(response: httpx.Response) -> dict:
+    return auth.decode_session_jwt(response.cookies['session_token'])
+
+
+def test_concurrent_expired_sessions_refresh_once(fake_discord):
+    refresh_token = fake_discord.add_session(USER['email'])
+
+    responses = send(expired_session(refresh_token), 'GET', '/user', times=5)
+
+    assert [response.status_code for response in responses] == [200] * 5
+    assert [response.json()['email'] for response in responses] == [USER['email']] * 5
+    # Discord rotates refresh tokens, a second refresh with the same one would fail
+    assert fake_discord.token_requests == [{'grant_type': 'refresh_token', 'refresh_token': refresh_token}]
+    sessions = [renewed_session(response) for response in responses]
+    assert all(session == sessions[0] for session in sessions)
+    assert sessions[0]['discord_refresh_token'] in fake_discord.refresh_tokens
+
+
+def test_renewed_cookie_on_handler_response(fake_discord):
+    refresh_token = fake_discord.add_session(USER['email'])
+
+    [response] = send(expired_session(refresh_token), 'POST', '/movies/import', json={'urls': []})
+
+    # The handler builds its own JSONResponse for the empty import
+    assert response.status_code == 400
+    assert response.json() == {'error': 'No movie URLs to import'}
+    assert renewed_session(response)['email'] == USER['email']
+    set_cookie = response.headers['set-cookie']
+    assert 'HttpOnly' in set_cookie
+    assert f'Max-Age={auth.SESSION_COOKIE_MAX_AGE}' in set_cookie
+
+
+def test_rejected_refresh_token(fake_discord):
+    [response] = send(expired_session('revoked'), 'GET', '/user')
+
+    assert response.status_code == 401
+    assert response.json() == {'error': 'Session expired'}
+    assert 'set-cookie' not in response.headers
+    assert len(fake_discord.token_requests) == 1
+
+    # The failure isn't remembered, the next request asks Discord again
+    send(expired_session('revoked'), 'GET', '/user')
+    assert len(fake_discord.token_requests) == 2
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+
+import broadcast
+from broadcast import PostgresBroadcast
+from database import db
+from events import EventBroker
+from movie_cache import MoviesCache
+
+
+async def until(condition, timeout: float = 5) -> None:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def events(broker: EventBroker) -> list[tuple[str, dict]]:
+    """(id, event) of everything in the broker's replay buffer; the workers don't
+    coalesce, so every frame holds one event."""
+    return [(event_id, event) for _seq, [event_id], payload in broker._history for event in json.loads(payload)]
+
+
+def run_workers(test, count: int = 2):
+    """Run test(workers) with count PostgresBroadcast/EventBroker pairs listening on one
+    fresh channel, like API workers sharing a database. Events aren't coalesced, so
+    they are sent out as soon as Postgres delivers them."""
+    async def run():
+        await db.open_pool()
+        channel = f"test_{uuid.uuid4().hex}"
+        workers = [PostgresBroadcast(EventBroker(coalesce_window=0), MoviesCache(), channel) for _ in range(count)]
+        try:
+            for worker in workers:
+                await worker.start()
+            await test(workers)
+        finally:
+            for worker in workers:
+                await worker.stop()
+            await db.close_pool()
+
+    asyncio.run(run())
+
+
+def test_workers_agree_on_ids_and_versions(database):
+    async def test(workers):
+        first, second = workers
+        await first.publish("movie_added", {"movie_id": "tt0113277"}, movie_change=True)
+        await second.publish("job_succeeded", {"job": {"id": "1", "status": "succeeded"}})
+        await second.publish("movie_deleted", {"movie_id": "tt0113277"}, movie_change=True)
+        await until(lambda: all(len(events(worker.broker)) == 3 for worker in workers))
+
+        received = events(first.broker)
+        assert events(second.broker) == received
+        assert [event["type"] for _id, event in received] == ["movie_added", "job_succeeded", "movie_deleted"]
+        added, deleted = received[0][1]["version"], received[2][1]["version"]
+        assert deleted == added + 1
+        assert "version" not in received[1][1]
+        assert first.cache.version == second.cache.version == deleted
+
+        # A client can resume on the other worker from an id the first one sent it
+        assert second.broker.position(received[0][0]) == first.broker.position(received[0][0])
+
+    run_workers(test)
+
+
+def test_chunked_events_are_reassembled(database):
+    async def test(workers):
+        first, second = workers
+        title = "Heat " * 5000
+        await first.publish("movie_added", {"movie": {"id": "tt0113277", "title": title}}, movie_change=True)
+        await until(lambda: all(events(worker.broker) for worker in workers))
+
+        for worker in workers:
+            [(_id, event)] = events(worker.broker)
+            assert event["movie"]["title"] == title
+        assert not first._partial and not second._partial
+
+    run_workers(test)
+
+
+def test_dropped_listen_connection_resyncs(database, monkeypatch):
+    monkeypatch.setattr(broadcast, 'LISTEN_RETRY_DELAY', 0.05)
+
+    async def test(workers):
+        [worker] = workers
+        await worker.publish("movie_added", {"movie_id": "tt0113277"}, movie_change=True)
+        await until(lambda: events(worker.broker))
+        [(event_id, _event)] = events(worker.broker)
+
+        client = worker.broker.subscribe(event_id)
+        assert (await anext(client))["event"] == "ping"
+
+        async with db.pool.connection() as conn:
+            await conn.execute(
+                "SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE query = %s",
+                (f'LISTEN "{worker.channel}"',)
+            )
+        # Events may have been lost while the connection was down
+        message = await asyncio.wait_for(anext(client), timeout=5)
+        assert message["event"] == "resync"
+        assert worker.broker.position(event_id) is None
+
+        # Listening again
+        await worker.publish("movie_deleted", {"movie_id": "tt0113277"}, movie_change=True)
+        message = await asyncio.wait_for(anext(client), timeout=5)
+        assert [event["type"] for event in json.loads(message["data"])] == ["movie_deleted"]
+        await client.aclose()
+
+    run_workers(test, count=1)
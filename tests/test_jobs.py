@@ -0,0 +1,31 @@
+import asyncio
+
+from database import db
+from jobs import JobFailed, JobQueue
+
+
+def test_jobs_are_visible_to_other_workers(database):
+    async def run():
+        await db.open_pool()
+        # The queues of two workers
+        queue, other = JobQueue("test", workers=1, max_queued=10), JobQueue("test", workers=1, max_queued=10)
+        queue.start()
+        try:
+            async def fail():
+                raise JobFailed("Failed to fetch movie data")
+
+            succeeded, _created = queue.submit("ok", lambda: asyncio.sleep(0, {"movie_id": "tt0113277"}))
+            failed, _created = queue.submit("fail", fail)
+            while (await db.get_saved_job(failed.id) or {}).get('status') != 'failed':
+                await asyncio.sleep(0.01)
+
+            assert other.get(succeeded.id) is None
+            assert await db.get_saved_job(succeeded.id) == succeeded.to_dict()
+            assert await db.get_saved_job(failed.id) == failed.to_dict()
+            assert failed.to_dict()['error'] == "Failed to fetch movie data"
+            assert await db.get_saved_job('unknown') is None
+        finally:
+            await queue.stop()
+            await db.close_pool()
+
+    asyncio.run(run())
@@ -0,0 +1,316 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import movienite
+from scrape_cache import scrape_cache
+from tests.pages import imdb_find_page, imdb_html_page, imdb_json_ld_page, imdb_next_data_page
+
+HEAT_URL = 'https://www.imdb.com/title/tt0113277/'
+HEAT_LETTERBOXD_URL = 'https://letterboxd.com/film/heat-1995/'
+
+
+def heat_site(request: httpx.Request) -> httpx.Response:
+    """IMDb and Letterboxd, knowing a single film."""
+    path = request.url.path
+    if path == '/title/tt0113277/':
+        return httpx.Response(200, html=imdb_html_page())
+    if path == '/find/':
+        return httpx.Response(200, html=imdb_find_page('/title/tt0113277/?ref_=fn_al_tt_1'))
+    if path == '/imdb/tt0113277/':
+        return httpx.Response(302, headers={'Location': HEAT_LETTERBOXD_URL})
+    if path == '/film/heat-1995/':
+        return httpx.Response(200, html='<html></html>')
+    return httpx.Response(404)
+
+
+HEAT_JSON_LD = {
+    '@type': 'Movie',
+    'name': 'Heat &amp; Dust',
+    'alternateName': 'Heat &amp; Dust',
+    'description': 'A group of professional bank robbers.',
+    'image': 'https://m.media-amazon.com/images/heat.jpg',
+    'aggregateRating': {'ratingValue': 8.3, 'ratingCount': 740_123},
+}
+HEAT_NEXT_DATA = {'props': {'pageProps': {'aboveTheFoldData': {
+    'titleText': {'text': 'Heat'},
+    'originalTitleText': {'text': 'Heat (original)'},
+    'plot': {'plotText': {'plainText': 'A group of professional bank robbers.'}},
+    'primaryImage': {'url': 'https://m.media-amazon.com/images/heat.jpg'},
+    'ratingsSummary': {'aggregateRating': 8.3, 'voteCount': 2_612},
+}}}}
+
+
+def test_parse_imdb_page_json_ld():
+    page = imdb_json_ld_page(json.dumps(HEAT_JSON_LD)) + imdb_html_page(title='Not read')
+
+    assert movienite.parse_imdb_page(page) == {
+        'title': 'Heat & Dust',
+        'original_title': '',
+        'description': 'A group of professional bank robbers.',
+        'image_link': 'https://m.media-amazon.com/images/heat.jpg',
+        'rating': '8.3',
+        'votes': '740K',
+    }
+
+
+def test_parse_imdb_page_next_data():
+    # Broken JSON-LD falls through to the page state
+    page = imdb_json_ld_page('{"name": ') + imdb_next_data_page(json.dumps(HEAT_NEXT_DATA))
+
+    assert movienite.parse_imdb_page(page) == {
+        'title': 'Heat',
+        'original_title': 'Heat (original)',
+        'description': 'A group of professional bank robbers.',
+        'image_link': 'https://m.media-amazon.com/images/heat.jpg',
+        'rating': '8.3',
+        'votes': '2.6K',
+    }
+
+
+def test_parse_imdb_page_html():
+    page = imdb_next_data_page('{"props": {}}') + imdb_html_page(original_title='Heat (original)')
+
+    assert movienite.HTML_PARSER == 'lxml'
+    assert movienite.parse_imdb_page(page) == {
+        'title': 'Heat',
+        'original_title': 'Heat (original)',
+        'description': 'A group of professional bank robbers.',
+        'image_link': 'https://m.media-amazon.com/images/heat.jpg',
+        'rating': '8.3',
+        'votes': '740K',
+    }
+
+
+def test_parse_imdb_page_without_title():
+    assert movienite.parse_imdb_page('<html><body><p>Not a title page</p></body></html>') is None
+
+
+@pytest.mark.parametrize(('count', 'expected'), [
+    (87, '87'),
+    (2_612, '2.6K'),
+    (345_200, '345K'),
+    (999_499, '999K'),
+    (999_500, '1M'),
+    (1_234_567, '1.2M'),
+    (3_000_000, '3M'),
+])
+def test_format_votes(count, expected):
+    assert movienite.format_votes(count) == expected
+
+
+def test_fetch_imdb(scraper_transport):
+    scraper_transport(heat_site)
+
+    movie = asyncio.run(movienite.fetch_imdb(HEAT_URL))
+
+    assert movie == {
+        'id': 'tt0113277',
+        'title': 'Heat',
+        'original_title': '',
+        'description': 'A group of professional bank robbers.',
+        'letterboxd_url': HEAT_LETTERBOXD_URL,
+        'imdb_url': HEAT_URL,
+        'image_link': 'https://m.media-amazon.com/images/heat.jpg',
+        'rating': '8.3',
+        'votes': '740K',
+        'boobies': False,
+        'watched': False,
+    }
+
+
+def test_fetch_imdb_timeout(scraper_transport):
+    def stalled(request):
+        raise httpx.ReadTimeout('timed out', request=request)
+
+    scraper_transport(stalled)
+
+    assert asyncio.run(movienite.fetch_imdb(HEAT_URL)) is None
+
+
+def test_fetch_imdb_letterboxd_lookup_timeout(scraper_transport, monkeypatch):
+    monkeypatch.setattr(movienite, 'LETTERBOXD_LOOKUP_TIMEOUT', 0.05)
+
+    async def site(request):
+        if request.url.host == 'letterboxd.com':
+            await asyncio.sleep(1)
+        return heat_site(request)
+
+    scraper_transport(site)
+
+    movie = asyncio.run(movienite.fetch_imdb(HEAT_URL))
+
+    assert movie['title'] == 'Heat'
+    assert movie['letterboxd_url'] == ''
+
+
+def test_fetch_imdb_missing_title(scraper_transport):
+    scraper_transport(heat_site)
+
+    assert asyncio.run(movienite.fetch_imdb('https://www.imdb.com/title/tt0000404/')) is None
+
+
+def test_fetch_timeout(scraper_transport):
+    def stalled(request):
+        raise httpx.ConnectTimeout('timed out', request=request)
+
+    scraper_transport(stalled)
+
+    with pytest.raises(httpx.ConnectTimeout):
+        asyncio.run(movienite.fetch(HEAT_URL))
+
+
+def test_client_timeouts():
+    client = movienite.get_client()
+    try:
+        assert client.timeout == movienite.SCRAPE_TIMEOUT
+        assert client.timeout.connect == 5.0
+        assert client.timeout.read == 10.0
+    finally:
+        asyncio.run(movienite.close_client())
+
+
+def test_fetch_letterboxd_searches_imdb(scraper_transport):
+    requests = scraper_transport(heat_site)
+
+    movie = asyncio.run(movienite.fetch_letterboxd(HEAT_LETTERBOXD_URL))
+
+    assert movie['id'] == 'tt0113277'
+    assert movie['letterboxd_url'] == HEAT_LETTERBOXD_URL
+    assert requests[0].url.params['q'] == 'heat 1995'
+
+
+def test_fetch_letterboxd_without_search_result(scraper_transport):
+    scraper_transport(lambda request: httpx.Response(200, html=imdb_find_page(None)))
+
+    assert asyncio.run(movienite.fetch_letterboxd(HEAT_LETTERBOXD_URL)) is None
+
+
+def test_fetch_boxd_follows_short_link(scraper_transport):
+    def site(request):
+        if request.url.host == 'boxd.it':
+            return httpx.Response(301, headers={'Location': HEAT_LETTERBOXD_URL})
+        return heat_site(request)
+
+    scraper_transport(site)
+
+    movie = asyncio.run(movienite.fetch_boxd('https://boxd.it/2bPk'))
+
+    assert movie['title'] == 'Heat'
+    assert movie['letterboxd_url'] == HEAT_LETTERBOXD_URL
+
+
+def test_fetch_imdb_is_cached(scraper_transport, scrape_cache_entries):
+    requests = scraper_transport(heat_site)
+
+    first = asyncio.run(movienite.fetch_imdb(HEAT_URL))
+    scraped = len(requests)
+    second = asyncio.run(movienite.fetch_imdb(HEAT_URL))
+
+    assert second == first
+    assert len(requests) == scraped
+    assert scrape_cache_entries['imdb:tt0113277'] == (first, scrape_cache.ttl)
+
+
+def test_fetch_imdb_caches_missing_title(scraper_transport, scrape_cache_entries):
+    scraper_transport(heat_site)
+
+    assert asyncio.run(movienite.fetch_imdb('https://www.imdb.com/title/tt0000404/')) is None
+    assert scrape_cache_entries['imdb:tt0000404'] == (None, scrape_cache.negative_ttl)
+
+
+def test_letterboxd_lookup_without_film(scraper_transport, scrape_cache_entries):
+    def site(request):
+        if request.url.host == 'letterboxd.com':
+            return httpx.Response(404)
+        return heat_site(request)
+
+    scraper_transport(site)
+
+    assert asyncio.run(movienite.fetch_letterboxd_url_by_imdb_id('tt0113277')) == ''
+    movie = asyncio.run(movienite.fetch_imdb(HEAT_URL))
+    # Letterboxd has no film for the title, that won't change soon
+    assert movie['letterboxd_url'] == ''
+    assert scrape_cache_entries['imdb:tt0113277'][1] == scrape_cache.ttl
+
+
+def connect_timeout(request):
+    raise httpx.ConnectTimeout('timed out', request=request)
+
+
+@pytest.mark.parametrize('failure', [
+    lambda request: httpx.Response(503),
+    lambda request: httpx.Response(403, html='<title>Just a moment...</title>'),
+    connect_timeout,
+])
+def test_letterboxd_lookup_failure(scraper_transport, scrape_cache_entries, failure):
+    def site(request):
+        if request.url.host == 'letterboxd.com':
+            return failure(request)
+        return heat_site(request)
+
+    scraper_transport(site)
+
+    assert asyncio.run(movienite.fetch_letterboxd_url_by_imdb_id('tt0113277')) is None
+    movie = asyncio.run(movienite.fetch_imdb(HEAT_URL))
+    # Cached only briefly, so the link is looked up again soon
+    assert movie['letterboxd_url'] == ''
+    assert scrape_cache_entries['imdb:tt0113277'][1] == scrape_cache.negative_ttl
+
+
+def test_concurrent_fetch_imdb_share_one_scrape(scraper_transport):
+    requests = scraper_transport(heat_site)
+
+    async def fetch_twice():
+        return await asyncio.gather(
+            movienite.fetch_imdb(HEAT_URL),
+            movienite.fetch_imdb(HEAT_URL, letterboxd_url=HEAT_LETTERBOXD_URL + 'reviews/'),
+        )
+
+    first, second = asyncio.run(fetch_twice())
+
+    assert [request.url.path for request in requests].count('/title/tt0113277/') == 1
+    assert first['letterboxd_url'] == HEAT_LETTERBOXD_URL
+    assert second['letterboxd_url'] == HEAT_LETTERBOXD_URL + 'reviews/'
+    assert first is not second
+
+
+def test_rate_limiter_spaces_requests_per_host():
+    limiter = movienite.HostRateLimiter(per_minute=600, burst=2)
+
+    async def wait(hosts):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        waited = []
+        for host in hosts:
+            await limiter.wait(host)
+            waited.append(loop.time() - start)
+        return waited
+
+    waited = asyncio.run(wait(['www.imdb.com'] * 4 + ['letterboxd.com']))
+
+    # The burst goes out at once, then one request every 0.1s; other hosts don't wait
+    assert waited[1] < 0.05
+    assert 0.08 < waited[2] < 0.2
+    assert 0.18 < waited[3] < 0.3
+    assert waited[4] - waited[3] < 0.05
+
+
+def test_rate_limiter_spaces_concurrent_waiters():
+    limiter = movienite.HostRateLimiter(per_minute=600, burst=1)
+
+    async def wait_concurrently():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        async def wait():
+            await limiter.wait('www.imdb.com')
+            return loop.time() - start
+
+        return sorted(await asyncio.gather(*(wait() for _ in range(4))))
+
+    waited = asyncio.run(wait_concurrently())
+
+    assert [round(w, 1) for w in waited] == [0.0, 0.1, 0.2, 0.3]
@@ -0,0 +1,32 @@
+from decimal import Decimal
+
+import pytest
+
+from compat.csv_migrator import validate_row
+from rating_refresher import format_rating, storable_rating
+
+
+@pytest.mark.parametrize(('value', 'expected'), [
+    ('8.3', Decimal('8.3')),
+    (8.25, Decimal('8.3')),
+    ('9.95', Decimal('10.0')),
+    ('10', Decimal('10.0')),
+    ('0', Decimal('0.0')),
+    ('10.1', None),
+    ('-1', None),
+    ('8.3/10', None),
+])
+def test_storable_rating(value, expected):
+    assert storable_rating(value) == expected
+
+
+def test_format_rating():
+    assert format_rating(Decimal('10')) == '10.0'
+    assert format_rating('7') == '7.0'
+    assert format_rating('n/a') == ''
+
+
+@pytest.mark.parametrize(('rating', 'valid'), [(None, True), (10.0, True), (9.96, True), (10.1, False)])
+def test_validate_row_rating(rating, valid):
+    row = {'id': 'tt0113277', 'title': 'Heat', 'rating': rating}
+    assert (validate_row(row) is None) == valid
@@ -0,0 +1,33 @@
+import asyncio
+import datetime
+
+from scrape_cache import ScrapeCache
+
+
+def test_sweeps_every_interval(scrape_cache_entries):
+    cache = ScrapeCache(ttl=datetime.timedelta(hours=1), max_entries=2, sweep_interval=3)
+
+    async def put(*ids):
+        for id in ids:
+            await cache.put(f'imdb:{id}', {'id': id})
+
+    asyncio.run(put('tt1', 'tt2'))
+    assert len(scrape_cache_entries) == 2
+    # The third write sweeps the table back down to max_entries
+    asyncio.run(put('tt3'))
+    assert len(scrape_cache_entries) == 2
+    asyncio.run(put('tt4', 'tt5'))
+    assert len(scrape_cache_entries) == 4
+    asyncio.run(put('tt6'))
+    assert len(scrape_cache_entries) == 2
+
+
+def test_negative_entries(scrape_cache_entries):
+    cache = ScrapeCache(ttl=datetime.timedelta(hours=1), negative_ttl=datetime.timedelta(minutes=5))
+
+    asyncio.run(cache.put('imdb:tt0', None))
+
+    assert asyncio.run(cache.get('imdb:tt0')) == (True, None)
+    assert asyncio.run(cache.get('imdb:tt1')) == (False, None)
+    assert scrape_cache_entries['imdb:tt0'] == (None, datetime.timedelta(minutes=5))
+    assert (cache.stats.negative_hits, cache.stats.misses) == (1, 1)